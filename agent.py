@@ -1,178 +1,444 @@
 import os
+import time
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
-from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
+from prompt_compiler import COMPILER
 from memory_manager import MemoryManager
+from summariser import SummaryWorker
+from context import ContextAssembler
+from prompt_cache import PromptCache
+from model_client import ModelGateway, ModelUnavailable
+from response_cache import content_key
+from context import count_tokens, message_tokens
+from commands import ROUTER, PERSONAS, DEFAULT_PERSONA, TASK_CONFIRMATIONS
+from metrics import stage, TOKENS, TURNS
 
 # Load .env.local
 load_dotenv(".env.local")
 
+# Summarise once the turns not yet summarised reach this many tokens
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("COPILOT_SUMMARY_TOKENS", "1500"))
+# Messages kept in history once older ones are summarised (and loaded on resume)
+HISTORY_WINDOW = 20
 
-class Copilot:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-        # Model
-        self.model = genai.GenerativeModel("models/gemini-2.5-pro")
+class Copilot:
+    def __init__(self, model=None, memory=None, summariser=None, prompt_cache=None,
+                 response_cache=None, prompts=None):
+        # Model (anything exposing generate_content / generate_content_async).
+        # A default model gets its own rate limiter / retry / circuit breaker;
+        # injected models are expected to be wrapped by the caller.
+        gateway = None
+        if model is None:
+            # Configure Gemini API. Only here: configure() drops the SDK's cached
+            # clients, and the server (which configures once) builds a Copilot per session.
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            gateway = ModelGateway()
+            model = gateway.wrap(genai.GenerativeModel("models/gemini-2.5-pro"))
+        self.model = model
+
+        # Persona engine, compiled per persona (see system_prompt)
+        self.prompts = prompts or COMPILER
+
+        # Static persona prompt registered once as cached content. An injected
+        # model without a cache keeps the old behaviour (prompt sent inline).
+        if prompt_cache is None and gateway is not None:
+            prompt_cache = PromptCache(wrap=gateway.wrap)
+        self.prompt_cache = prompt_cache
+
+        # Replies keyed by the exact assembled context (optional, shareable)
+        self.response_cache = response_cache
+
+        # Memory manager (long-term neutral profiles, shareable across sessions)
+        self.memory = memory or MemoryManager()
+        self.active_profile = "general"
 
-        # System / persona prompt
-        self.system_prompt = AGENT_INSTRUCTION + "\n\n" + SESSION_INSTRUCTION
+        # Persona and no-filter mode, switched locally by commands (see commands.py)
+        self.persona = DEFAULT_PERSONA
+        self.no_filter = False
 
-        # Memory manager (long-term neutral profiles)
-        self.memory = MemoryManager()
-        self.active_profile = "general"
+        # Background summarisation (shareable across sessions)
+        self.summariser = summariser or SummaryWorker(self.model)
 
         # Short-term conversation history (session only)
         self.history = []
         self.turn_count = 0
+        self.summarised = 0  # history[:summarised] is already covered by a summary
+        self.log = None  # durable HistoryLog, attached by the session registry
+
+        # Keeps each request within the input token budget
+        self.context = ContextAssembler()
+        self.last_context = None  # per-section token breakdown of the last request
+
+    @property
+    def system_prompt(self) -> str:
+        """Shared engine rules plus the active persona's profile only."""
+        return self.prompts.compile(self.persona)
+
+    # ---------- SESSION STATE ----------
+
+    def export_state(self) -> dict:
+        """Per-session state (sizes in /sessions; load_state migrates sessions parked before history logs)."""
+        return {
+            "history": self.history,
+            "turn_count": self.turn_count,
+            "summarised": self.summarised,
+            "active_profile": self.active_profile,
+            "persona": self.persona,
+            "no_filter": self.no_filter,
+        }
+
+    def load_state(self, state: dict):
+        self.history = state.get("history", [])
+        self.turn_count = state.get("turn_count", 0)
+        self.summarised = min(state.get("summarised", 0), len(self.history))
+        self._apply_settings(state)
+
+    def _apply_settings(self, state: dict):
+        profile = state.get("active_profile", "general")
+        self.active_profile = profile if profile in self.memory.PROFILES else "general"
+        persona = state.get("persona", DEFAULT_PERSONA)
+        self.persona = persona if persona in PERSONAS else DEFAULT_PERSONA
+        self.no_filter = bool(state.get("no_filter", False))
+
+    def _set(self, **settings):
+        """Change session settings (profile, persona, filter) and log the change."""
+        for name, value in settings.items():
+            setattr(self, name, value)
+        if self.log is not None:
+            self.log.set(**settings)
+
+    def attach_log(self, log, resume: bool = True):
+        """
+        Append every history message to `log` from now on. With resume,
+        first pick up where the log left off (its recent window becomes
+        history); otherwise write the current history to it.
+        """
+        self.log = log
+        if resume:
+            loaded = log.load(HISTORY_WINDOW)
+            if loaded is not None:
+                self.history, state = loaded
+                self.turn_count = state["turn_count"]
+                self._apply_settings(state)
+                self.summarised = max(0, len(self.history) - state["unsummarised"])
+            return
+
+        log.state.update(turn_count=self.turn_count, active_profile=self.active_profile,
+                         persona=self.persona, no_filter=self.no_filter)
+        for msg in self.history[:self.summarised]:
+            log.append(msg, self.turn_count)
+        log.checkpoint()
+        for msg in self.history[self.summarised:]:
+            log.append(msg, self.turn_count)
 
     # ---------- INTERNAL HELPERS ----------
 
-    def _build_system_with_memory(self) -> str:
+    def _append(self, msg: dict):
+        self.history.append(msg)
+        if self.log is not None:
+            self.log.append(msg, self.turn_count)
+
+    def _build_contents(self, user_input: str) -> list:
         """
-        Combine the persona engine with a neutral memory context
-        for injection as the leading "setup" message.
+        Combine the persona engine (unless it is served as a cached system
+        instruction), a neutral memory context (with items
+        relevant to the user's message) and as much recent history as
+        the token budget allows.
         """
-        memory_text = self.memory.build_memory_context(self.active_profile)
-        return (
-            self.system_prompt
-            + "\n\n[NEUTRAL MEMORY CONTEXT]\n"
-            + memory_text
-        )
+        with stage("memory_context"):
+            memory_text = self.memory.build_memory_context(self.active_profile, query=user_input)
+        with stage("assemble"):
+            contents, self.last_context = self.context.assemble(
+                self.system_prompt, memory_text, self.history,
+                inline_system=self.prompt_cache is None, session_state=self._session_state(),
+            )
+        return contents
+
+    def _session_state(self) -> str:
+        """What the commands switched locally, for the model to follow."""
+        return (f"Active persona: {self.persona}\n"
+                f"No-filter mode: {'ON' if self.no_filter else 'OFF'}")
+
+    def _cache_key(self, contents: list) -> str:
+        # The persona prompt is part of the context even when served from the prompt cache
+        return content_key(self.system_prompt, contents)
+
+    def _chat_model(self):
+        """The model to converse with: bound to the cached persona prompt when caching is on."""
+        if self.prompt_cache is None:
+            return self.model
+        return self.prompt_cache.model_for(self.system_prompt)
+
+    async def _achat_model(self):
+        """_chat_model() without blocking the event loop on prompt cache API calls."""
+        if self.prompt_cache is None:
+            return self.model
+        return await self.prompt_cache.amodel_for(self.system_prompt)
 
     def _maybe_summarise(self):
         """
-        Balanced summarisation:
-        - every ~15 turns
-        - only if at least ~10 messages in history
-        - saves a neutral summary into long-term memory
-        - trims old history to avoid bloat
+        Once the turns since the last summary reach SUMMARY_TRIGGER_TOKENS,
+        hand just those turns to the background worker (which folds them
+        into the rolling summaries), then trim old history to avoid bloat.
+        The reply is not held up by the summariser's model call.
         """
-        if self.turn_count % 15 != 0:
+        new = self.history[self.summarised:]
+        if sum(message_tokens(m) for m in new) < SUMMARY_TRIGGER_TOKENS:
             return
-        if len(self.history) < 10:
-            return
-
-        # Build a plain-text transcript
-        convo_lines = []
-        for msg in self.history:
-            role = msg.get("role", "user")
-            parts = msg.get("parts", [""])
-            text = parts[0] if parts else ""
-            role_label = "USER" if role == "user" else "COPILOT"
-            convo_lines.append(f"{role_label}: {text}")
-        transcript = "\n".join(convo_lines)
-
-        prompt = (
-            "You are a neutral summariser.\n"
-            "Summarise the following conversation in 5–10 bullet points.\n"
-            "Focus on: user preferences, facts, decisions, goals, and ongoing tasks.\n"
-            "Do NOT imitate any persona or style. Write neutrally.\n\n"
-            f"Conversation:\n{transcript}"
-        )
 
-        resp = self.model.generate_content(
-            contents=[{"role": "user", "parts": [prompt]}]
-        )
-        summary = resp.text
-        self.memory.save_summary(summary)
+        self.summariser.submit(id(self), new, self.memory)
+        self.summarised = len(self.history)
+        if self.log is not None:
+            self.log.checkpoint()
 
         # Trim history to last ~20 messages to keep things light
-        self.history = self.history[-20:]
+        dropped = max(0, len(self.history) - HISTORY_WINDOW)
+        self.history = self.history[dropped:]
+        self.summarised -= dropped
 
     def _handle_command(self, user_input: str):
         """
-        Handle explicit memory / control commands.
-        Returns a reply string if handled, or None to continue normal flow.
-        """
-        lower = user_input.lower().strip()
-
-        # Switch profile
-        if lower.startswith("switch profile:"):
-            name = lower.split(":", 1)[1].strip()
-            if name in self.memory.PROFILES:
-                self.active_profile = name
-                return f"Okay, I’ll focus on the **{name}** memory profile."
-            else:
-                return (
-                    f"I don’t recognise a '{name}' profile. "
-                    f"Available profiles: {', '.join(self.memory.PROFILES)}."
-                )
-
-        # Wipe memory
-        if lower in ("wipe memory", "reset memory", "wipe all memory"):
-            self.memory.wipe_all()
-            self.history.clear()
-            return "All long-term memory has been cleared. Short-term chat history is reset too."
-
-        # List memories
-        if lower in ("list memories", "show memories"):
-            return self.memory.list_memories()
-
-        # Remember explicit
-        if lower.startswith("remember this:") or lower.startswith("remember:"):
-            # preserve original casing after ':'
-            text = user_input.split(":", 1)[1].strip()
-            profile = self.memory.classify(text)
-            self.memory.add_memory(profile, text)
-            self.memory.save_all()
-            return f"Got it. I’ll remember that under the **{profile}** profile."
-
-        # Forget items containing substring
-        if lower.startswith("forget:"):
-            text = user_input.split(":", 1)[1].strip()
-            removed = self.memory.forget_matching(text)
-            self.memory.save_all()
-            return f"Forgot {removed} matching memory item(s)."
-
-        # Show memory summary context
-        if lower in ("summarise memory", "summarize memory", "memory summary"):
-            return self.memory.build_memory_context(self.active_profile)
-
-        return None
+        Handle the commands advertised in SESSION_INSTRUCTION locally.
+        Returns a reply string if handled, or None to continue normal flow
+        (ordinary chat, or a state command followed by a question).
+        """
+        found = ROUTER.match(user_input)
+        if found is None:
+            return None
+        name, args = found
+        return getattr(self, f"_cmd_{name}")(*args)
+
+    # ---------- COMMANDS ----------
+
+    def _cmd_persona(self, name: str, rest: str):
+        persona = next(p for p in PERSONAS if p.lower() == name.lower())
+        self._set(persona=persona)
+        if rest:
+            return None
+        return TASK_CONFIRMATIONS[persona] + f" {persona} mode."
+
+    def _cmd_filter_on(self, rest: str):
+        self._set(no_filter=True)
+        return None if rest else "No filter is on."
+
+    def _cmd_filter_off(self, rest: str):
+        self._set(no_filter=False)
+        return None if rest else "Back to normal filter."
+
+    def _cmd_switch_profile(self, name: str):
+        name = name.strip().lower()
+        if name in self.memory.PROFILES:
+            self._set(active_profile=name)
+            return f"Okay, I’ll focus on the **{name}** memory profile."
+        return (
+            f"I don’t recognise a '{name}' profile. "
+            f"Available profiles: {', '.join(self.memory.PROFILES)}."
+        )
+
+    def _cmd_wipe(self):
+        self.memory.wipe_all()
+        self.history.clear()
+        self.summarised = 0
+        if self.log is not None:
+            self.log.clear()
+        return "All long-term memory has been cleared. Short-term chat history is reset too."
+
+    def _cmd_list_memories(self):
+        return self.memory.list_memories()
+
+    def _cmd_memory_summary(self):
+        return self.memory.build_memory_context(self.active_profile)
+
+    def _cmd_add_task(self, remember: str, text: str):
+        count = self.memory.add_task(text)
+        if remember:
+            # Also keep it in long-term memory, like "remember: ..."
+            self.memory.add_memory(self.memory.classify(text), text, pinned=True)
+            self.memory.schedule_save()
+        return f"{TASK_CONFIRMATIONS[self.persona]} Task {count} added: {text}"
+
+    def _cmd_list_tasks(self):
+        tasks = self.memory.list_tasks()
+        if not tasks:
+            return "No tasks yet. Add one with “task: ...”."
+        return "Tasks:\n" + "\n".join(f"{i}. {text}" for i, text in enumerate(tasks, 1))
+
+    def _cmd_clear_tasks(self):
+        return f"Cleared {self.memory.clear_tasks()} task(s)."
+
+    def _cmd_remember(self, text: str):
+        text = text.strip()
+        profile = self.memory.classify(text)
+        self.memory.add_memory(profile, text, pinned=True)
+        self.memory.schedule_save()
+        return f"Got it. I’ll remember that under the **{profile}** profile."
+
+    def _cmd_forget(self, text: str):
+        removed = self.memory.forget_matching(text.strip())
+        self.memory.schedule_save()
+        return f"Forgot {removed} matching memory item(s)."
 
     # ---------- MAIN RUN ----------
 
-    def run(self, user_input: str) -> str:
+    def _begin_turn(self, user_input: str):
+        """
+        Shared first half of a turn.
+        Returns (reply, None) if a command or the response cache answered
+        the input, otherwise (None, contents) ready to send to the model.
+        """
         self.turn_count += 1
 
         # First, check if the user is issuing a memory/control command
-        command_reply = self._handle_command(user_input)
+        with stage("command"):
+            command_reply = self._handle_command(user_input)
         if command_reply is not None:
+            TURNS.inc(outcome="command")
             # Log this interaction in short-term history as well
-            self.history.append(
-                {"role": "user", "parts": [user_input]}
-            )
-            self.history.append(
-                {"role": "model", "parts": [command_reply]}
-            )
-            return command_reply
+            self._append({"role": "user", "parts": [user_input]})
+            self._append({"role": "model", "parts": [command_reply]})
+            return command_reply, None
 
         # Normal conversational flow
-        self.history.append(
-            {"role": "user", "parts": [user_input]}
-        )
+        self._append({"role": "user", "parts": [user_input]})
 
-        system_with_mem = self._build_system_with_memory()
+        contents = self._build_contents(user_input)
 
-        contents = [{"role": "user", "parts": [system_with_mem]}] + self.history
+        # Exactly this context has been answered before: skip the model call
+        if self.response_cache is not None:
+            with stage("response_cache"):
+                cached = self.response_cache.get(self._cache_key(contents))
+            if cached is not None:
+                TURNS.inc(outcome="cache")
+                self._append({"role": "model", "parts": [cached]})
+                return cached, None
 
-        response = self.model.generate_content(contents=contents)
-        reply_text = response.text
+        TURNS.inc(outcome="model")
+        TOKENS.inc(self.last_context["total"], direction="input")
+        return None, contents
 
-        self.history.append(
-            {"role": "model", "parts": [reply_text]}
-        )
+    def _finish_turn(self, reply_text: str, contents: list):
+        """Shared second half of a model turn."""
+        TOKENS.inc(count_tokens(reply_text), direction="output")
+        self._append({"role": "model", "parts": [reply_text]})
+
+        if self.response_cache is not None:
+            self.response_cache.put(self._cache_key(contents), reply_text)
 
         # Occasionally summarise to keep things efficient
-        self._maybe_summarise()
+        with stage("summarise"):
+            self._maybe_summarise()
+
+        # Persist long-term memory (debounced; only changed profiles are written)
+        with stage("schedule_save"):
+            self.memory.schedule_save()
+
+    def run(self, user_input: str) -> str:
+        command_reply, contents = self._begin_turn(user_input)
+        if command_reply is not None:
+            return command_reply
+
+        with stage("model"):
+            response = self._chat_model().generate_content(contents=contents)
+            reply_text = response.text
+
+        self._finish_turn(reply_text, contents)
+        return reply_text
+
+    async def arun(self, user_input: str) -> str:
+        """
+        Awaitable version of run() for the server: the model call goes
+        through the async client so the event loop keeps serving other
+        requests while Gemini is generating.
+        """
+        command_reply, contents = self._begin_turn(user_input)
+        if command_reply is not None:
+            return command_reply
+
+        with stage("model"):
+            model = await self._achat_model()
+            response = await model.generate_content_async(contents=contents)
+            reply_text = response.text
 
-        # Persist long-term memory (if anything changed earlier)
-        self.memory.save_all()
+        self._finish_turn(reply_text, contents)
+        return reply_text
+
+    async def astream(self, user_input: str):
+        """
+        Streaming version of arun(): yields reply chunks as the model
+        produces them. The full reply is added to history once the
+        stream completes.
+        """
+        command_reply, contents = self._begin_turn(user_input)
+        if command_reply is not None:
+            yield command_reply
+            return
+
+        with stage("model_stream"):
+            with stage("model_first_chunk"):
+                model = await self._achat_model()
+                response = await model.generate_content_async(contents=contents, stream=True)
+            chunks = []
+            async for chunk in response:
+                text = chunk.text
+                if text:
+                    chunks.append(text)
+                    yield text
+
+        self._finish_turn("".join(chunks), contents)
+
+    # ---------- BATCH ----------
+
+    async def _arun_stateless(self, prompt: str) -> str:
+        """One independent prompt: persona + memory, but no history in or out."""
+        memory_text = self.memory.build_memory_context(self.active_profile, query=prompt)
+        contents, _ = self.context.assemble(
+            self.system_prompt, memory_text, [{"role": "user", "parts": [prompt]}],
+            inline_system=self.prompt_cache is None, session_state=self._session_state(),
+        )
 
+        key = self._cache_key(contents)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        model = await self._achat_model()
+        response = await model.generate_content_async(contents=contents)
+        reply_text = response.text
+        if self.response_cache is not None:
+            self.response_cache.put(key, reply_text)
         return reply_text
 
+    async def arun_batch(self, prompts: list, concurrency: int = 8) -> list:
+        """
+        Run independent prompts with at most `concurrency` model calls in flight.
+        Results come back in input order; a failing prompt gets an error entry
+        instead of failing the batch.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(index: int, prompt: str) -> dict:
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    reply, error = await self._arun_stateless(prompt), None
+                except Exception as e:
+                    reply, error = None, f"{type(e).__name__}: {e}"
+                return {
+                    "index": index,
+                    "reply": reply,
+                    "error": error,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                }
+
+        return await asyncio.gather(*(one(i, p) for i, p in enumerate(prompts)))
+
+    def run_batch(self, prompts: list, concurrency: int = 8) -> list:
+        """Blocking wrapper around arun_batch() for scripts and nightly jobs."""
+        return asyncio.run(self.arun_batch(prompts, concurrency))
+
 
 if __name__ == "__main__":
     bot = Copilot()
@@ -183,8 +449,13 @@ if __name__ == "__main__":
         user_input = input("You: ")
         if user_input.lower() in ["quit", "exit", "bye"]:
             print("Copilot: Goodbye.")
-            bot.memory.save_all()
+            bot.summariser.close()
+            bot.memory.close()
             break
 
-        output = bot.run(user_input)
+        try:
+            output = bot.run(user_input)
+        except ModelUnavailable as e:
+            print("\nCopilot: The model is unavailable right now, please try again shortly.", e, "\n")
+            continue
         print("\nCopilot:", output, "\n")
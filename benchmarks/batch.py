@@ -0,0 +1,40 @@
+"""
+/chat/batch versus one POST per prompt.
+
+    python -m benchmarks.batch --prompts 100 --latency 0.2
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import offline_app
+
+
+async def main(args):
+    prompts = [f"nightly prompt {i}" for i in range(args.prompts)]
+    async with offline_app(latency=args.latency) as client:
+        start = time.perf_counter()
+        for p in prompts[:args.sequential]:
+            (await client.post("/chat", json={"text": p})).raise_for_status()
+        per_prompt = (time.perf_counter() - start) / args.sequential
+        print(f"sequential /chat      : {per_prompt * args.prompts:7.2f} s for {args.prompts} "
+              f"(extrapolated from {args.sequential})")
+
+        for concurrency in args.levels:
+            # Fresh prompts each level so the response cache does not help
+            batch = [f"{p} @c{concurrency}" for p in prompts]
+            r = await client.post("/chat/batch", json={"prompts": batch, "concurrency": concurrency})
+            r.raise_for_status()
+            body = r.json()
+            assert [x["index"] for x in body["results"]] == list(range(len(batch)))
+            print(f"/chat/batch c={body['concurrency']:<3}    : {body['elapsed_ms'] / 1000:7.2f} s, "
+                  f"{body['errors']} errors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=100)
+    parser.add_argument("--sequential", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""
+Bulk JSONL memory import / export throughput, through the CLI functions and over HTTP.
+
+Writes N synthetic rows (a third with no profile, so they get classified)
+to a scratch file, imports it into an empty memory directory with
+memory_io.import_jsonl for each --stores backend, exports it back and
+checks the round trip. Then does the same through POST /memory/import
+and GET /memory/export on the offline server.
+
+    python -m benchmarks.bulk_io --items 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from benchmarks.common import offline_app
+from benchmarks.retrieval import vocabulary
+from classifier import DEFAULT_KEYWORDS
+
+PROFILES = list(DEFAULT_KEYWORDS) + ["general"]
+
+
+def write_rows(path: str, n: int, rng):
+    words = vocabulary(20000, rng)
+    keywords = [k for ks in DEFAULT_KEYWORDS.values() for k in ks]
+    with open(path, "w") as f:
+        for i in range(n):
+            text = " ".join(rng.choices(words, k=8) + [rng.choice(keywords)]) + f" #{i}"
+            row = {"text": text, "source": "bench"}
+            if i % 3:
+                row["profile"] = rng.choice(PROFILES)
+            f.write(json.dumps(row) + "\n")
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cli_round_trip(store: str, path: str, n: int, batch_size: int):
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    os.environ["COPILOT_MEMORY_STORE"] = store
+    from memory_io import export_jsonl, import_jsonl
+    from memory_manager import MemoryManager
+
+    memory = MemoryManager(flush_interval=0)
+    start = time.perf_counter()
+    with open(path) as f:
+        report = import_jsonl(memory, f, batch_size)
+    imported = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exported = sum(1 for _ in export_jsonl(memory))
+    export_s = time.perf_counter() - start
+    memory.close()
+
+    # A fresh process view must hold exactly what was imported
+    start = time.perf_counter()
+    reloaded = MemoryManager()
+    loaded = sum(len(items) for items in reloaded.memories.values())
+    reload_s = time.perf_counter() - start
+    reloaded.close()
+
+    assert report["imported"] == exported == loaded == n, (report, exported, loaded)
+    print(f"{store:>8}: import {n / imported:8.0f} items/s ({report['classified']} classified)  "
+          f"export {exported / export_s:8.0f} items/s  reload {reload_s:5.2f} s  peak RSS {rss_mb():6.0f} MB")
+
+
+async def http_round_trip(path: str, n: int):
+    async with offline_app(latency=0) as client:
+        async def body():
+            with open(path, "rb") as f:
+                while chunk := f.read(256 * 1024):
+                    yield chunk
+
+        start = time.perf_counter()
+        r = await client.post("/memory/import", content=body(),
+                              headers={"Content-Type": "application/x-ndjson"})
+        imported = time.perf_counter() - start
+        report = r.json()
+
+        start = time.perf_counter()
+        lines = 0
+        async with client.stream("GET", "/memory/export") as r:
+            async for _ in r.aiter_lines():
+                lines += 1
+        exported = time.perf_counter() - start
+
+    assert report["imported"] == lines == n, (report, lines)
+    print(f"{'http':>8}: import {n / imported:8.0f} items/s ({report['classified']} classified)  "
+          f"export {lines / exported:8.0f} items/s")
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="copilot-bench-"), "rows.jsonl")
+    write_rows(path, args.items, random.Random(7))
+    print(f"{args.items} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+    for store in args.stores:
+        cli_round_trip(store, path, args.items, args.batch_size)
+    if not args.skip_http:
+        os.environ["COPILOT_MEMORY_STORE"] = args.stores[-1]
+        asyncio.run(http_round_trip(path, args.items))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--stores", nargs="+", default=["json", "sqlite"],
+                        choices=["json", "journal", "sqlite"])
+    parser.add_argument("--skip-http", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,121 @@
+"""
+Memory classifier throughput: the old substring scans vs the compiled classifier.
+
+Generates N chat-like memory texts (random filler words with a profile
+keyword mixed into most of them), then times the original per-text
+`any(k in t ...)` heuristic, Classifier.classify and Classifier.classify_many
+over the whole batch, and again with keyword tables padded to a few
+hundred / thousand entries. Also prints texts the old heuristic and the
+word-boundary matcher disagree on, and how often the optional naive
+Bayes fallback files an otherwise "general" text.
+
+    python -m benchmarks.classifier --texts 100000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import vocabulary
+from classifier import DEFAULT_KEYWORDS, Classifier
+
+
+def legacy_classify(text: str) -> str:
+    """MemoryManager.classify before classifier.py, kept verbatim for comparison."""
+    t = text.lower()
+
+    if any(k in t for k in ("exam", "test", "gcse", "school", "teacher", "class", "homework", "revision")):
+        return "school"
+    if any(k in t for k in ("friend", "friends", "crush", "gf", "boyfriend",
+                            "girlfriend", "relationship", "mate", "bro", "pooks", "people")):
+        return "relationships"
+    if any(k in t for k in ("goal", "aim", "dream", "plan", "future", "i want to", "my target", "my goal")):
+        return "goals"
+    if any(k in t for k in ("fact", "definition", "means", "stands for", "is called", "is when")):
+        return "knowledge"
+    return "general"
+
+
+def substring_classify(text: str, keywords: dict) -> str:
+    """The legacy approach generalised to any keyword table: one any() scan per profile."""
+    t = text.lower()
+    for profile, words in keywords.items():
+        if any(k in t for k in words):
+            return profile
+    return "general"
+
+
+# Words that contain a keyword without being one
+DECOYS = ["brother", "latest", "planet", "classic", "ultimate", "aiming", "facts", "contest", "broke", "climate"]
+
+
+def make_texts(n: int, rng) -> list:
+    words = vocabulary(5000, rng) + DECOYS
+    keywords = [k for ks in DEFAULT_KEYWORDS.values() for k in ks]
+    texts = []
+    for _ in range(n):
+        text = rng.choices(words, k=rng.randint(6, 20))
+        if rng.random() < 0.7:
+            text.insert(rng.randrange(len(text)), rng.choice(keywords))
+        texts.append(" ".join(text).capitalize())
+    return texts
+
+
+def timed(label: str, fn, n: int):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:8.1f} ms  {n / elapsed:10.0f} texts/s")
+    return result, elapsed
+
+
+def main(args):
+    rng = random.Random(3)
+    texts = make_texts(args.texts, rng)
+    classifier = Classifier()
+
+    print(f"{args.texts} texts")
+    old, base = timed("legacy any(k in t)", lambda: [legacy_classify(t) for t in texts], args.texts)
+    one, single = timed("Classifier.classify", lambda: [classifier.classify(t) for t in texts], args.texts)
+    many, batch = timed("Classifier.classify_many", lambda: classifier.classify_many(texts), args.texts)
+    print(f"speed-up vs legacy: classify {base / single:.1f}x, classify_many {base / batch:.1f}x")
+    assert one == many, "classify_many disagrees with classify"
+
+    changed = [(t, a, b) for t, a, b in zip(texts, old, one) if a != b]
+    print(f"\n{len(changed)} texts ({len(changed) / len(texts):.1%}) classified differently, e.g.:")
+    decoys = [c for c in changed if any(d in c[0].lower().split() for d in DECOYS)]
+    for text, a, b in decoys[:args.examples]:
+        print(f"  {a:>13} -> {b:<13} {text[:70]}")
+
+    # Larger keyword tables: substring scans grow with every keyword, the compiled regex barely
+    rng = random.Random(4)
+    print()
+    for extra in args.extra_keywords:
+        keywords = {profile: words + tuple(vocabulary(extra // len(DEFAULT_KEYWORDS), rng))
+                    for profile, words in DEFAULT_KEYWORDS.items()}
+        total = sum(len(words) for words in keywords.values())
+        big = Classifier(keywords)
+        _, base = timed(f"{total} keywords: substring", lambda: [substring_classify(t, keywords) for t in texts],
+                        args.texts)
+        _, batch = timed(f"{total} keywords: classify_many", lambda: big.classify_many(texts), args.texts)
+        print(f"{'':<28} {base / batch:8.1f}x")
+
+    # Naive Bayes fallback, trained on what the keywords filed
+    memories = {}
+    for text, profile in zip(texts, many):
+        memories.setdefault(profile, []).append({"text": text})
+    start = time.perf_counter()
+    classifier.train(memories)
+    print(f"\nnaive Bayes trained on {len(texts)} texts in {(time.perf_counter() - start) * 1000:.0f} ms")
+    with_bayes, _ = timed("classify_many + Bayes", lambda: classifier.classify_many(texts), args.texts)
+    moved = sum(a != b for a, b in zip(many, with_bayes))
+    print(f"Bayes fallback filed {moved} of {many.count('general')} 'general' texts elsewhere")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=100000)
+    parser.add_argument("--examples", type=int, default=8)
+    parser.add_argument("--extra-keywords", type=int, nargs="*", default=[200, 1000],
+                        help="also time tables padded with this many synthetic keywords")
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+"""
+Advertised commands: handled locally vs sent to the model.
+
+Sends every command quoted in SESSION_INSTRUCTION (with "..." filled in)
+through Copilot with FakeModel at --latency seconds per call, and reports
+which ones reached the model and how long each took, next to which ones
+the old memory-only command handler would have sent to the model. Also
+times the router on ordinary chat messages, which it must pass through.
+
+    python -m benchmarks.commands --latency 1.5
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+import timeit
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from agent import Copilot
+from commands import ROUTER
+from fake_model import FakeModel
+from prompts import SESSION_INSTRUCTION
+from summariser import SummaryWorker
+
+
+def legacy_handles(text: str) -> bool:
+    """The commands the pre-router _handle_command knew about."""
+    lower = text.lower().strip()
+    return (lower.startswith(("switch profile:", "remember this:", "remember:", "forget:"))
+            or lower in ("wipe memory", "reset memory", "wipe all memory", "list memories",
+                         "show memories", "summarise memory", "summarize memory", "memory summary"))
+
+
+def advertised() -> list:
+    quoted = re.findall(r'^- "(.+)"$', SESSION_INSTRUCTION, re.MULTILINE)
+    commands = [q.replace("...", "revise physics on sunday") for q in quoted]
+    # Destructive ones last, so the listing commands have something to show
+    return sorted(commands, key=lambda c: c in ("wipe memory", "clear tasks"))
+
+
+def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    model = FakeModel(latency=args.latency)
+    bot = Copilot(model=model, summariser=SummaryWorker(model))
+
+    print(f"{'command':<40} {'before':>8} {'now':>8} {'ms':>9}")
+    legacy_calls = 0
+    for command in advertised():
+        calls = model.calls
+        start = time.perf_counter()
+        bot.run(command)
+        elapsed = (time.perf_counter() - start) * 1000
+        legacy = "local" if legacy_handles(command) else "model"
+        legacy_calls += legacy == "model"
+        now = "model" if model.calls > calls else "local"
+        print(f"{command:<40} {legacy:>8} {now:>8} {elapsed:9.3f}")
+
+    print(f"\nmodel calls for {len(advertised())} commands: {legacy_calls} before, {model.calls} now "
+          f"(~{legacy_calls * args.latency:.1f} s of model time saved)")
+    print(f"state after: persona {bot.persona}, no filter {bot.no_filter}, tasks {bot.memory.list_tasks()}")
+
+    chat = "what should I revise tonight for my physics exam on monday?"
+    n = 100000
+    per_call = timeit.timeit(lambda: ROUTER.match(chat), number=n) / n * 1e6
+    print(f"router on ordinary chat: {per_call:.2f} µs per message")
+    bot.summariser.close()
+    bot.memory.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=1.5)
+    main(parser.parse_args())
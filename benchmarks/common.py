@@ -0,0 +1,71 @@
+"""Shared setup for the offline benchmarks."""
+import os
+import sys
+import socket
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmarks size memory themselves: no eviction unless one asks for it
+os.environ.setdefault("COPILOT_MEMORY_CAPACITY", "0")
+
+
+def sample_photo(width: int = 4032, height: int = 3024, quality: int = 95) -> bytes:
+    """A phone-camera-sized JPEG with noisy detail and an EXIF block."""
+    import io
+    import os as _os
+    from PIL import Image
+
+    noise = Image.frombytes("L", (width // 8, height // 8), _os.urandom(width * height // 64))
+    img = Image.merge("RGB", [noise.resize((width, height), Image.BICUBIC)] * 3)
+    exif = Image.Exif()
+    exif[0x0110] = "Phone Camera"  # Model
+    exif[0x0112] = 1  # Orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, exif=exif.tobytes())
+    return out.getvalue()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def offline_app(**fake_options):
+    """
+    Import server with FakeModel installed, inside a scratch directory
+    so the benchmark never touches the real memory/ folder, and serve it
+    with uvicorn on a local port (real sockets, so streaming is not buffered).
+    Yields an httpx.AsyncClient pointed at it.
+    """
+    import httpx
+    import uvicorn
+    import fake_model
+
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    # The fake has no quota: keep the gateway's rate limiter out of the numbers
+    os.environ.setdefault("COPILOT_MODEL_RPM", "1000000000")
+    os.environ.setdefault("COPILOT_MODEL_TPM", "1000000000000")
+    fake_model.install(**fake_options)
+    import server
+
+    port = _free_port()
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+    uv = uvicorn.Server(config)
+    task = asyncio.create_task(uv.serve())
+    while not uv.started:
+        await asyncio.sleep(0.01)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}",
+                                     timeout=None, limits=limits) as client:
+            yield client
+    finally:
+        uv.should_exit = True
+        await task
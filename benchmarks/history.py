@@ -0,0 +1,99 @@
+"""
+Session history durability and resume cost after a restart.
+
+Plays --sessions conversations of --turns turns through SessionRegistry
+with FakeModel, plus one long conversation of --long-turns turns, then
+drops the registry without shutting it down (a crash or a deploy that
+kills the process). A fresh registry must come up without reading any
+session, and each session's first request must resume exactly the
+history window, turn count, profile, persona and summary checkpoint it had.
+Reports the per-message logging cost and resume latency short vs long.
+
+    python -m benchmarks.history --sessions 200 --turns 30 --long-turns 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import percentile, vocabulary
+from agent import Copilot
+from fake_model import FakeModel
+from memory_manager import MemoryManager
+from sessions import SessionRegistry
+from summariser import SummaryWorker
+
+
+def snapshot(bot) -> tuple:
+    return bot.history, bot.turn_count, bot.active_profile, bot.persona, len(bot.history) - bot.summarised
+
+
+def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    rng = random.Random(3)
+    words = vocabulary(5000, rng)
+    model = FakeModel(latency=0, reply_words=40)
+    memory = MemoryManager(flush_interval=3600)
+    summariser = SummaryWorker(model)
+    registry = SessionRegistry(lambda: Copilot(model=model, memory=memory, summariser=summariser),
+                               max_sessions=args.sessions + 1)
+
+    ids = [SessionRegistry.new_id() for _ in range(args.sessions + 1)]
+    log_ms = []
+    for i, session_id in enumerate(ids):
+        turns = args.long_turns if i == 0 else args.turns
+        bot = registry.get(session_id)
+        for turn in range(turns):
+            if turn == turns // 3:
+                bot.run("Switch to Butler")
+            if turn == turns // 2:
+                bot.run("switch profile: school")
+            start = time.perf_counter()
+            bot.run(" ".join(rng.choices(words, k=20)))
+            elapsed = time.perf_counter() - start
+            if i:
+                log_ms.append(elapsed * 1000)
+    summariser.drain()
+    before = {session_id: snapshot(registry.sessions[session_id][0]) for session_id in ids}
+    segments = len(os.listdir(registry._log_dir(ids[0])))
+
+    # Same turns without a log, for the logging overhead
+    plain = Copilot(model=model, memory=memory, summariser=summariser)
+    plain_ms = []
+    for _ in range(len(log_ms)):
+        start = time.perf_counter()
+        plain.run(" ".join(rng.choices(words, k=20)))
+        plain_ms.append((time.perf_counter() - start) * 1000)
+    summariser.drain()
+
+    # "Crash": nothing is closed or parked
+    start = time.perf_counter()
+    fresh = SessionRegistry(registry.factory, max_sessions=args.sessions + 1)
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    resume_ms = []
+    for session_id in ids:
+        start = time.perf_counter()
+        bot = fresh.get(session_id)
+        resume_ms.append((time.perf_counter() - start) * 1000)
+        assert snapshot(bot) == before[session_id], session_id
+
+    print(f"{args.sessions} sessions x {args.turns} turns + 1 x {args.long_turns} turns ({segments} segments)")
+    print(f"turn p50 {percentile(plain_ms, 50):.3f} ms without a log, {percentile(log_ms, 50):.3f} ms with "
+          f"({percentile(log_ms, 50) - percentile(plain_ms, 50):+.3f} ms for two appended messages)")
+    print(f"restart: registry ready in {startup_ms:.2f} ms, every session resumed intact")
+    short = resume_ms[1:]
+    print(f"resume: short sessions p50 {percentile(short, 50):.2f} ms  p99 {percentile(short, 99):.2f} ms, "
+          f"{args.long_turns}-turn session {resume_ms[0]:.2f} ms")
+    summariser.close()
+    memory.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--long-turns", type=int, default=5000)
+    main(parser.parse_args())
@@ -0,0 +1,37 @@
+"""
+/vision image preprocessing: bytes received vs bytes forwarded to the
+model, and end-to-end latency, for phone-camera-sized photos.
+
+    python -m benchmarks.image --uploads 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import offline_app, sample_photo
+
+
+async def main(args):
+    async with offline_app(latency=args.latency) as client:
+        print(f"{'photo':>11} {'bytes in':>10} {'bytes sent':>11} {'ratio':>6} {'sent size':>10} {'ms':>8}")
+        for width, height in ((4032, 3024), (3000, 4000), (1280, 720)):
+            times = []
+            for i in range(args.uploads):
+                photo = sample_photo(width, height)
+                start = time.perf_counter()
+                r = await client.post("/vision", files={"file": (f"p{i}.jpg", photo, "image/jpeg")})
+                r.raise_for_status()
+                times.append((time.perf_counter() - start) * 1000)
+                report = r.json()["image"]
+            sent = "x".join(map(str, report["sent_size"]))
+            print(f"{width}x{height:<6} {report['bytes_in']:>10} {report['bytes_sent']:>11} "
+                  f"{report['bytes_in'] / report['bytes_sent']:>5.1f}x {sent:>10} "
+                  f"{statistics.median(times):>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--uploads", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
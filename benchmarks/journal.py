@@ -0,0 +1,73 @@
+"""
+JsonStore vs JournalStore.
+
+- write cost: time for add_memory + save_all on a profile that already
+  holds N items (JsonStore rewrites the array, JournalStore appends a line)
+- startup: time to construct MemoryManager when a profile holds N items
+  entirely in the journal (worst case replay) and after compaction
+
+    python -m benchmarks.journal --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from memory_manager import MemoryManager
+from storage import JsonStore, JournalStore
+
+
+def fresh_dir():
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+
+
+def fill(memory, n: int):
+    for i in range(n):
+        memory.add_memory("general", f"seed memory item number {i} about something")
+    memory.save_all()
+
+
+def write_cost(store_cls, n: int, writes: int = 20) -> float:
+    fresh_dir()
+    memory = MemoryManager(store=store_cls(compact_every=10 ** 9) if store_cls is JournalStore else store_cls(),
+                           flush_interval=0)
+    fill(memory, n)
+    start = time.perf_counter()
+    for i in range(writes):
+        memory.add_memory("general", f"new item {i}")
+        memory.save_all()
+    elapsed = (time.perf_counter() - start) / writes
+    memory.close()
+    return elapsed * 1000
+
+
+def startup(n: int):
+    fresh_dir()
+    memory = MemoryManager(store=JournalStore(compact_every=10 ** 9), flush_interval=0)
+    fill(memory, n)
+    memory.close()
+
+    start = time.perf_counter()
+    memory = MemoryManager(store=JournalStore(compact_every=10 ** 9))
+    replay = time.perf_counter() - start
+    memory.store.compact("general", memory.memories["general"])
+    memory.close()
+
+    start = time.perf_counter()
+    MemoryManager(store=JournalStore()).close()
+    snapshot = time.perf_counter() - start
+    return replay * 1000, snapshot * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'json ms/write':>14} {'journal ms/write':>17} {'replay ms':>10} {'snapshot ms':>12}")
+    for n in args.sizes:
+        json_ms = write_cost(JsonStore, n)
+        journal_ms = write_cost(JournalStore, n)
+        replay_ms, snapshot_ms = startup(n)
+        print(f"{n:>8} {json_ms:>14.3f} {journal_ms:>17.3f} {replay_ms:>10.1f} {snapshot_ms:>12.1f}")
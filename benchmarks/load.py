@@ -0,0 +1,47 @@
+"""
+Load test for the /chat endpoint against a fake local model.
+
+Serves the FastAPI app locally with FakeModel standing in for Gemini,
+then measures requests/sec at increasing numbers of concurrent clients.
+With the async path, throughput should scale roughly linearly with
+concurrency until the event loop saturates.
+
+    python -m benchmarks.load --latency 0.2 --requests 200
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import offline_app
+
+
+async def drive(client, total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            # One session per simulated client
+            headers = {"X-Session-Id": f"bench-client-{i % concurrency:04d}"}
+            r = await client.post("/chat", json={"text": f"hello {i}"}, headers=headers)
+            r.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    async with offline_app(latency=args.latency) as client:
+        print(f"fake latency {args.latency * 1000:.0f} ms, {args.requests} requests per level")
+        print(f"{'clients':>8} {'seconds':>9} {'req/s':>9}")
+        for concurrency in args.levels:
+            elapsed = await drive(client, args.requests, concurrency)
+            print(f"{concurrency:>8} {elapsed:>9.2f} {args.requests / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Cost of the /metrics instrumentation on the hot path, plus a sample scrape.
+
+    python -m benchmarks.metrics --turns 200
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import offline_app
+from metrics import Histogram
+
+
+def per_call_us(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+BENCH = Histogram("bench_seconds", "Scratch histogram, not registered.", ["stage"])
+
+
+def noop_stage():
+    with BENCH.time(stage="bench"):
+        pass
+
+
+async def main(args):
+    h = BENCH
+    print(f"Histogram.observe      : {per_call_us(lambda: h.observe(0.003, stage='x'), args.n):6.2f} us")
+    print(f"with h.time(...)       : {per_call_us(noop_stage, args.n):6.2f} us")
+
+    async with offline_app(latency=args.latency) as client:
+        start = time.perf_counter()
+        for i in range(args.turns):
+            (await client.post("/chat", json={"text": f"metrics turn {i}"})).raise_for_status()
+        elapsed = time.perf_counter() - start
+        # 8 stages per model turn + the HTTP middleware
+        overhead = 9 * per_call_us(noop_stage, args.n) / 1e6 * args.turns
+        print(f"{args.turns} turns          : {elapsed:.2f} s, instrumentation ~{overhead * 1000:.2f} ms "
+              f"({overhead / elapsed:.3%})")
+
+        start = time.perf_counter()
+        r = await client.get("/metrics")
+        r.raise_for_status()
+        print(f"scrape                 : {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{len(r.text.splitlines())} lines")
+        if args.show:
+            print(r.text)
+        else:
+            for line in r.text.splitlines():
+                if line.startswith(("copilot_stage_seconds_sum", "copilot_tokens_total",
+                                    "copilot_memory_items", "copilot_response_cache_hit_rate")):
+                    print("  " + line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("-n", type=int, default=200_000)
+    parser.add_argument("--show", action="store_true", help="print the whole scrape")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""
+Stress the shared memory store from several processes at once.
+
+Each worker runs its own Copilot on the same memory/ directory, as
+`uvicorn server:app --workers N` would, and fires `remember:` / `forget:`
+commands as fast as it can. Afterwards every worker must see every other
+worker's surviving items, and a fresh process must load exactly the
+expected set: nothing lost, nothing forgotten coming back.
+
+    python -m benchmarks.multiprocess --procs 4 --ops 500
+    python -m benchmarks.multiprocess --store json   # refused: one process only
+"""
+import argparse
+import multiprocessing as mp
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+
+MARKER_RE = re.compile(r"<w\d+:\d+>")
+
+
+def marker(worker: int, i: int) -> str:
+    return f"<w{worker}:{i}>"
+
+
+def worker(index: int, args, directory: str, barrier, results):
+    os.chdir(directory)
+    os.environ["COPILOT_MEMORY_STORE"] = args.store
+    import fake_model
+    fake_model.install(latency=0)
+    from agent import Copilot
+    from storage import StoreInUse
+
+    barrier.wait()
+    try:
+        bot = Copilot()
+    except StoreInUse as e:
+        results.put((index, "refused", str(e), 0))
+        barrier.wait()
+        return
+
+    kept = set()
+    start = time.perf_counter()
+    for i in range(args.ops):
+        bot.run(f"remember: worker {index} note {i} {marker(index, i)}")
+        kept.add(marker(index, i))
+        if i % args.forget_every == args.forget_every - 1:
+            # Forget an earlier note of ours
+            victim = marker(index, i - 1)
+            reply = bot.run(f"forget: {victim}")
+            assert reply.startswith("Forgot 1 "), reply
+            kept.discard(victim)
+    elapsed = time.perf_counter() - start
+
+    # Everyone is done writing: each worker must now see all the others' notes
+    barrier.wait()
+    bot.memory.sync()
+    seen = {m for items in bot.memory.memories.values() for item in items
+            for m in MARKER_RE.findall(item["text"])}
+    bot.summariser.close()
+    bot.memory.close()
+    results.put((index, "ok", (kept, seen), elapsed))
+
+
+def main(args):
+    directory = tempfile.mkdtemp(prefix="copilot-bench-")
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(args.procs)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(i, args, directory, barrier, results))
+             for i in range(args.procs)]
+    for p in procs:
+        p.start()
+    outcomes = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    refused = [o for o in outcomes if o[1] == "refused"]
+    if refused:
+        print(f"{len(refused)} of {args.procs} workers refused to start:\n  {refused[0][2]}")
+        return
+
+    expected = set().union(*(kept for _, _, (kept, _), _ in outcomes))
+    total_ops = args.procs * (args.ops + args.ops // args.forget_every)
+    slowest = max(elapsed for *_, elapsed in outcomes)
+    print(f"{args.procs} workers x {args.ops} remembers (+ a forget every {args.forget_every}): "
+          f"{total_ops / slowest:.0f} commands/s overall")
+    for index, _, (_, seen), _ in sorted(outcomes, key=lambda o: o[0]):
+        missing, extra = expected - seen, seen - expected
+        print(f"worker {index} view  : {len(seen)} items, {len(missing)} missing, {len(extra)} stale")
+
+    os.chdir(directory)
+    os.environ["COPILOT_MEMORY_STORE"] = args.store
+    from memory_manager import MemoryManager
+    memory = MemoryManager()
+    loaded = {m for items in memory.memories.values() for item in items
+              for m in MARKER_RE.findall(item["text"])}
+    memory.close()
+    lost, resurrected = expected - loaded, loaded - expected
+    print(f"fresh load     : {len(loaded)} items (expected {len(expected)}), "
+          f"{len(lost)} lost, {len(resurrected)} resurrected")
+    if lost or resurrected:
+        raise SystemExit("FAILED: store is not consistent across processes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--forget-every", type=int, default=3)
+    parser.add_argument("--store", default="sqlite", choices=["sqlite", "json", "journal"])
+    main(parser.parse_args())
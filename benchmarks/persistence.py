@@ -0,0 +1,75 @@
+"""
+Per-turn persistence cost of MemoryManager.
+
+Compares the old policy (rewrite all five profiles and summary.txt on
+every turn) with dirty tracking + debounced flushing, over a run of
+chat turns where only every --remember-every'th turn stores a memory.
+
+    python -m benchmarks.persistence --items 2000 --turns 300
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from memory_manager import MemoryManager
+
+
+def legacy_save_all(memory):
+    """The pre-dirty-tracking save_all: every file, every turn."""
+    for profile, items in memory.memories.items():
+        with open(memory.store._path(profile), "w") as f:
+            json.dump(items, f, indent=2)
+    with open(os.path.join(memory.store.memory_dir, "summary.txt"), "w") as f:
+        f.write(memory.summary)
+    return len(memory.memories) + 1
+
+
+def seeded(items: int, flush_interval: float) -> MemoryManager:
+    memory = MemoryManager(flush_interval=flush_interval)
+    for i in range(items):
+        profile = MemoryManager.PROFILES[i % len(MemoryManager.PROFILES)]
+        memory.add_memory(profile, f"seed memory item number {i} about something")
+    memory.save_summary("- seeded summary")
+    memory.save_all()
+    memory.writes = 0
+    return memory
+
+
+def run(policy: str, args) -> dict:
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    memory = seeded(args.items, args.flush_ms / 1000)
+    files = 0
+    start = time.perf_counter()
+    for turn in range(args.turns):
+        if turn % args.remember_every == 0:
+            memory.add_memory("general", f"remembered on turn {turn}")
+        if policy == "legacy":
+            files += legacy_save_all(memory)
+        else:
+            memory.schedule_save()
+        # Stand-in for the rest of the turn (model call etc.)
+        time.sleep(args.turn_ms / 1000)
+    if policy != "legacy":
+        memory.close()
+        files = memory.writes
+    elapsed = time.perf_counter() - start - args.turns * args.turn_ms / 1000
+    return {"policy": policy, "file_writes": files, "io_ms_per_turn": elapsed / args.turns * 1000}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--remember-every", type=int, default=10)
+    parser.add_argument("--turn-ms", type=float, default=5)
+    parser.add_argument("--flush-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    print(f"{args.items} items, {args.turns} turns, remember every {args.remember_every} turns")
+    print(f"{'policy':>10} {'file writes':>12} {'io ms/turn':>11}")
+    for policy in ("legacy", "debounced"):
+        r = run(policy, args)
+        print(f"{r['policy']:>10} {r['file_writes']:>12} {r['io_ms_per_turn']:>11.3f}")
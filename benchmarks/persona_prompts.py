@@ -0,0 +1,79 @@
+"""
+Persona-sliced system prompts: tokens per persona vs the full persona engine.
+
+Compiles each persona's prompt with PromptCompiler and checks it keeps
+every shared section but only the profiles it needs. Reports prompt
+tokens per persona against the full engine, the per-turn input tokens of
+an uncached Copilot turn with the full prompt vs the sliced one, and
+what parsing and (memoized) compilation cost.
+
+    python -m benchmarks.persona_prompts
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from agent import Copilot
+from commands import PERSONAS
+from fake_model import FakeModel
+from prompt_compiler import PROFILE_RE, RELATED, PromptCompiler
+from summariser import SummaryWorker
+
+
+class FullPrompt:
+    """The old behaviour: the whole engine whatever the persona."""
+
+    def __init__(self, compiler):
+        self.full = compiler.full
+
+    def compile(self, persona: str) -> str:
+        return self.full
+
+
+def check(compiler):
+    titles = [title for _, title, _ in compiler.sections]
+    for persona in PERSONAS:
+        prompt = compiler.compile(persona)
+        assert all(title in prompt for title in titles), persona
+        kept = {m.group(1).title() for m in PROFILE_RE.finditer(prompt)}
+        assert kept == {persona, *RELATED.get(persona, ())}, (persona, kept)
+
+
+def turn_tokens(prompts, persona: str, message: str) -> int:
+    model = FakeModel(latency=0)
+    bot = Copilot(model=model, summariser=SummaryWorker(model), prompts=prompts)
+    bot.run(f"switch to {persona}")
+    bot.run(message)
+    total = bot.last_context["total"]
+    bot.summariser.close()
+    bot.memory.close()
+    return total
+
+
+def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    compiler = PromptCompiler()
+    check(compiler)
+    report = compiler.report()
+
+    print(f"full persona engine: {report['full_tokens']} tokens (version {report['version']})")
+    print(f"{'persona':>10} {'prompt':>7} {'saved':>7} {'turn (full)':>12} {'turn (sliced)':>14}")
+    for persona, row in report["personas"].items():
+        os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+        full = turn_tokens(FullPrompt(compiler), persona, args.message)
+        os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+        sliced = turn_tokens(compiler, persona, args.message)
+        print(f"{persona:>10} {row['tokens']:>7} {row['saved_pct']:>6.1f}% {full:>12} {sliced:>14}")
+
+    parse_ms = timeit.timeit(PromptCompiler, number=20) / 20 * 1000
+    n = 100000
+    memo_us = timeit.timeit(lambda: compiler.compile("Butler"), number=n) / n * 1e6
+    print(f"parse + split at startup: {parse_ms:.2f} ms; memoized compile per turn: {memo_us:.2f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--message", default="what should I revise tonight for my physics exam?")
+    main(parser.parse_args())
@@ -0,0 +1,103 @@
+"""
+Prompt cache lifecycle and per-turn input tokens, fully offline.
+
+Drives Copilot with FakeCacheBackend and a fake clock:
+create on first turn, reuse, TTL refresh near expiry, recreation after
+upstream expiry, recreation when the persona prompt changes, and the
+uncached system-instruction fallback. Then compares per-turn input
+tokens that have to be processed with and without the cached prompt,
+and measures how long the event loop stalls while arun() opens a cache
+whose API calls take 0.5 s each.
+
+    python -m benchmarks.prompt_cache
+"""
+import os
+import time
+import asyncio
+import tempfile
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from agent import Copilot
+from fake_model import FakeCacheBackend, FakeModel
+from prompt_cache import PromptCache
+from prompt_compiler import PromptCompiler
+from prompts import AGENT_INSTRUCTION
+from summariser import SummaryWorker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def step(label, cache, backend):
+    print(f"{label:<38} {cache.stats}  live caches: {len(backend.caches)}")
+
+
+async def loop_stall(bot) -> float:
+    """Longest gap (ms) between 1 ms ticks of the event loop during one arun()."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last)
+            last = now
+
+    tick = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    await bot.arun("hello")
+    done = True
+    await tick
+    return worst * 1000
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    clock = Clock()
+    backend = FakeCacheBackend(clock=clock, latency=0)
+    cache = PromptCache(ttl=3600, refresh_margin=300, backend=backend, clock=clock)
+    model = FakeModel(latency=0)
+    bot = Copilot(model=model, summariser=SummaryWorker(model), prompt_cache=cache)
+
+    bot.run("hello")
+    step("first turn (create)", cache, backend)
+    bot.run("again")
+    step("second turn (reuse local handle)", cache, backend)
+    clock.now += 3400
+    bot.run("near expiry")
+    step("within refresh margin (extend TTL)", cache, backend)
+    clock.now += 7200
+    bot.run("after a long idle")
+    step("expired upstream (recreate)", cache, backend)
+    bot.prompts = PromptCompiler(AGENT_INSTRUCTION + "\nEdited persona rule.")
+    bot.run("prompt changed")
+    step("AGENT_INSTRUCTION changed (new cache)", cache, backend)
+    fresh = PromptCache(backend=backend, clock=clock)
+    fresh.model_for(bot.system_prompt)
+    print(f"{'other worker / restart (find existing)':<38} {fresh.stats}")
+    refused = PromptCache(backend=FakeCacheBackend(clock=clock, fail_create=True), clock=clock)
+    m = refused.model_for(bot.system_prompt)
+    print(f"{'caching refused (fallback)':<38} {refused.stats}  system_instruction set: {m.system_instruction is not None}")
+
+    print()
+    inline = Copilot(model=model, memory=bot.memory, summariser=SummaryWorker(model))
+    for b in (inline, bot):
+        b.run("what should I revise tonight?")
+        r = b.last_context
+        processed = r["total"] - (r["persona"] if r["persona_cached"] else 0)
+        print(f"persona cached={r['persona_cached']!s:<5}  prompt tokens {r['total']:>5}  "
+              f"processed per turn {processed:>5}")
+
+    print()
+    slow = PromptCache(backend=FakeCacheBackend(call_latency=0.5, latency=0))
+    bot.prompt_cache = slow
+    print(f"event loop stall while arun() opens the cache (0.5 s per API call): "
+          f"{asyncio.run(loop_stall(bot)):.1f} ms  {slow.stats}")
@@ -0,0 +1,97 @@
+"""
+Model gateway (rate limit, retry, circuit breaker, hedging) against a faulty fake model.
+
+    python -m benchmarks.resilience --calls 200 --error-rate 0.3
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import percentile
+from fake_model import FakeModel
+from model_client import CircuitBreaker, ModelGateway, ModelUnavailable
+
+CONTENTS = [{"role": "user", "parts": ["How is the build doing?"]}]
+
+
+def gateway(**kwargs):
+    options = {"rpm": 100_000, "tpm": 100_000_000, "base_delay": 0.01, "max_delay": 0.2,
+               "hedge_after": 0, "rng": random.Random(1)}
+    return ModelGateway(**{**options, **kwargs})
+
+
+async def run(model, calls: int, concurrency: int = 32):
+    """Return (successes, latencies) for `calls` requests."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    ok = 0
+
+    async def one():
+        nonlocal ok
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await model.generate_content_async(contents=CONTENTS)
+                ok += 1
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return ok, latencies
+
+
+async def main(args):
+    fake = dict(latency=args.latency, seed=7)
+
+    print(f"-- transient errors ({args.error_rate:.0%} of calls fail with 429/503)")
+    ok, _ = await run(FakeModel(error_rate=args.error_rate, **fake), args.calls)
+    print(f"bare model      : {ok}/{args.calls} succeeded")
+    g = gateway()
+    ok, _ = await run(g.wrap(FakeModel(error_rate=args.error_rate, **fake)), args.calls)
+    print(f"with gateway    : {ok}/{args.calls} succeeded, {g.stats['retries']} retries")
+
+    print("-- outage (every call fails)")
+    g = gateway(breaker=CircuitBreaker(threshold=5, cooldown=30), base_delay=0.2, max_delay=2)
+    outage = g.wrap(FakeModel(error_rate=1.0, **fake))
+    start = time.perf_counter()
+    for _ in range(args.outage_calls):
+        try:
+            await outage.generate_content_async(contents=CONTENTS)
+        except ModelUnavailable:
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"{args.outage_calls} calls       : {elapsed:.2f} s, {g.stats['calls']} upstream attempts, "
+          f"{g.stats['rejected']} failed fast, circuit {g.breaker.state}")
+
+    print(f"-- slow tail ({args.tail_rate:.0%} of calls take {args.tail_latency:.1f} s)")
+    slow = dict(tail_rate=args.tail_rate, tail_latency=args.tail_latency, **fake)
+    for label, hedge_after in (("no hedging", 0), (f"hedge @{args.hedge_after:.2f}s", args.hedge_after)):
+        g = gateway(hedge_after=hedge_after)
+        _, lat = await run(g.wrap(FakeModel(**slow)), args.calls)
+        ms = sorted(x * 1000 for x in lat)
+        print(f"{label:<16}: p50 {percentile(ms, 50):6.0f} ms  p99 {percentile(ms, 99):6.0f} ms  "
+              f"({g.stats['calls']} upstream calls, {g.stats['hedge_wins']} hedge wins)")
+
+    print(f"-- rate limit ({args.rpm} requests/minute)")
+    g = gateway(rpm=args.rpm)
+    calls = args.rpm + args.rpm // 30
+    start = time.perf_counter()
+    await run(g.wrap(FakeModel(latency=0)), calls, concurrency=calls)
+    print(f"{calls} calls      : {time.perf_counter() - start:.2f} s "
+          f"(burst of {args.rpm}, then {args.rpm / 60:.0f}/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--outage-calls", type=int, default=50)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    parser.add_argument("--hedge-after", type=float, default=0.3)
+    parser.add_argument("--rpm", type=int, default=600)
+    asyncio.run(main(parser.parse_args()))
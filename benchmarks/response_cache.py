@@ -0,0 +1,59 @@
+"""
+Response cache: /vision latency for a first upload vs a repeat of the
+same image, plus raw ResponseCache lookup cost per tier.
+
+    python -m benchmarks.response_cache --latency 0.5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import offline_app, sample_photo
+
+
+async def upload(client, data: bytes) -> float:
+    start = time.perf_counter()
+    r = await client.post("/vision", files={"file": ("photo.jpg", data, "image/jpeg")})
+    r.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def tier_lookup_us(server, runs: int = 2000):
+    from response_cache import ResponseCache
+
+    cache = server.response_cache
+    key = "f" * 64
+    cache.put(key, "cached reply " * 50)
+    start = time.perf_counter()
+    for _ in range(runs):
+        cache.get(key)
+    memory_us = (time.perf_counter() - start) / runs * 1e6
+
+    cold = ResponseCache(cache_dir=cache.cache_dir)  # empty memory tier, same files
+    start = time.perf_counter()
+    cold.get(key)
+    disk_us = (time.perf_counter() - start) * 1e6
+    return memory_us, disk_us
+
+
+async def main(args):
+    async with offline_app(latency=args.latency) as client:
+        import server
+
+        image = sample_photo(1600, 1200)
+        first = await upload(client, image)
+        repeats = [await upload(client, image) for _ in range(args.repeats)]
+        print(f"/vision first upload : {first:8.2f} ms")
+        print(f"/vision repeat (p50) : {statistics.median(repeats):8.2f} ms")
+        memory_us, disk_us = tier_lookup_us(server)
+        print(f"memory tier lookup   : {memory_us:8.2f} us")
+        print(f"disk tier lookup     : {disk_us:8.2f} us")
+        print("stats:", (await client.get("/cache")).json())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Memory retention: cost of keeping profiles at capacity with LRU / LFU / FIFO eviction.
+
+Adds --items memories to one profile capped at --capacity, touching a few
+random items after each add (as build_memory_context does with what it
+quotes), and reports the median / p99 add latency with eviction against
+an uncapped run, plus what a linear scan for the LRU item would cost at
+that size. Pinned items must all survive; the profile must end at capacity.
+
+    python -m benchmarks.retention --items 60000 --capacity 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import percentile
+
+# Embeddings would dominate every add; this is about the eviction bookkeeping
+os.environ.setdefault("COPILOT_SEMANTIC_MEMORY", "0")
+
+from memory_manager import MemoryManager  # noqa: E402
+from retention import Policy, last_used  # noqa: E402
+
+
+def run(order: str, capacity: int, args) -> dict:
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    memory = MemoryManager(flush_interval=3600)
+    memory.retention.policies["general"] = Policy(capacity=capacity, order=order)
+    memory.retention.clear()
+    rng = random.Random(11)
+
+    samples = []
+    pinned = 0
+    for i in range(args.items):
+        pin = i % 100 == 0
+        pinned += pin
+        start = time.perf_counter()
+        memory.add_memory("general", f"note {i}", pinned=pin)
+        items = memory.memories["general"]
+        memory.touch("general", rng.sample(items, min(args.touches, len(items))))
+        samples.append((time.perf_counter() - start) * 1000)
+
+    items = memory.memories["general"]
+    kept_pins = sum(1 for item in items if item.get("pinned"))
+    assert kept_pins == pinned, (kept_pins, pinned)
+    assert not capacity or len(items) == capacity, len(items)
+
+    start = time.perf_counter()
+    min(items, key=last_used)
+    scan_ms = (time.perf_counter() - start) * 1000
+    memory.close()
+    return {"p50": percentile(samples, 50), "p99": percentile(samples, 99),
+            "kept": len(items), "scan_ms": scan_ms}
+
+
+def main(args):
+    print(f"{args.items} adds to one profile, {args.touches} touches after each, 1% pinned")
+    base = run("lru", 0, args)
+    print(f"{'uncapped':>10}: add+touch p50 {base['p50']:.3f}  p99 {base['p99']:.3f} ms  ({base['kept']} items)")
+    for order in ("lru", "lfu", "fifo"):
+        r = run(order, args.capacity, args)
+        print(f"{order:>10}: add+touch p50 {r['p50']:.3f}  p99 {r['p99']:.3f} ms  ({r['kept']} items kept)")
+    print(f"a linear scan for the LRU item at {r['kept']} items: {r['scan_ms']:.2f} ms per eviction")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=60000)
+    parser.add_argument("--capacity", type=int, default=20000)
+    parser.add_argument("--touches", type=int, default=3)
+    main(parser.parse_args())
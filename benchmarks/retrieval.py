@@ -0,0 +1,69 @@
+"""
+BM25 memory retrieval latency.
+
+Fills the index with N synthetic memory items (Zipf-distributed words
+from a fixed vocabulary, so some terms are common and most are rare)
+and times MemoryManager.search / build_memory_context for user-like queries.
+
+    python -m benchmarks.retrieval --items 50000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from memory_manager import MemoryManager
+
+
+def vocabulary(size: int, rng) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def sentence(words, cum_weights, rng, length: int) -> str:
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=length))
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocab", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    words = vocabulary(args.vocab, rng)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    memory = MemoryManager()
+    start = time.perf_counter()
+    for i in range(args.items):
+        profile = MemoryManager.PROFILES[i % len(MemoryManager.PROFILES)]
+        memory.add_memory(profile, sentence(words, weights, rng, rng.randint(5, 15)))
+    build = time.perf_counter() - start
+    memory.flush_interval = 0  # nothing below needs saving
+
+    queries = [sentence(words, weights, rng, rng.randint(4, 12)) for _ in range(args.queries)]
+    for name, fn in (
+        ("search", lambda q: memory.search(q, 8)),
+        ("build_memory_context", lambda q: memory.build_memory_context("general", query=q)),
+    ):
+        samples = []
+        for q in queries:
+            t = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - t) * 1000)
+        print(f"{name:>22}: p50 {statistics.median(samples):.3f} ms  "
+              f"p95 {percentile(samples, 95):.3f} ms  p99 {percentile(samples, 99):.3f} ms")
+    print(f"{args.items} items indexed incrementally in {build:.2f} s "
+          f"({build / args.items * 1e6:.1f} us per add_memory)")
@@ -0,0 +1,57 @@
+"""
+Time-to-first-token for /chat/stream versus /chat.
+
+The fake model emits its first chunk after --latency seconds and one
+word every --chunk-delay seconds after that, so the non-streaming
+endpoint pays for the whole generation before the first byte while the
+SSE endpoint only pays for the first chunk.
+
+    python -m benchmarks.stream --words 200 --chunk-delay 0.01
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import offline_app
+
+
+async def timed_chat(client):
+    start = time.perf_counter()
+    r = await client.post("/chat", json={"text": "tell me a story"})
+    r.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def timed_stream(client):
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/chat/stream", json={"text": "tell me a story"}) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if first is None and line.startswith("data: "):
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def main(args):
+    reply = " ".join(f"word{i}" for i in range(args.words))
+    async with offline_app(latency=args.latency, chunk_delay=args.chunk_delay, reply=reply) as client:
+        print(f"{args.words} words, first chunk {args.latency * 1000:.0f} ms, "
+              f"{args.chunk_delay * 1000:.0f} ms/word, {args.runs} runs")
+        print(f"{'endpoint':>14} {'ttft ms':>9} {'total ms':>9}")
+        for name, fn in (("/chat", timed_chat), ("/chat/stream", timed_stream)):
+            results = [await fn(client) for _ in range(args.runs)]
+            ttft = statistics.median(r[0] for r in results) * 1000
+            total = statistics.median(r[1] for r in results) * 1000
+            print(f"{name:>14} {ttft:>9.1f} {total:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,225 @@
+"""
+Regression suite: /chat and /vision under load plus MemoryManager micro-benchmarks, saved as JSON.
+
+Drives the server (with FakeModel in place of Gemini) at a fixed
+concurrency and reports p50/p95/p99 latency and requests/sec, then
+times MemoryManager operations at each --sizes item count. Results go
+to benchmarks/results/<commit>.json; pass --compare with an older file
+to see what moved.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --quick --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+from benchmarks.common import ROOT, offline_app
+from benchmarks.retrieval import percentile, vocabulary
+from memory_manager import MemoryManager
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def summarise(latencies: list, elapsed: float, errors: int) -> dict:
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 1),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+    }
+
+
+async def drive(total: int, concurrency: int, send) -> dict:
+    """Call `send(i)` `total` times with at most `concurrency` in flight."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            r = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarise(latencies, time.perf_counter() - start, errors)
+
+
+def small_photo(rng, width: int = 1600, height: int = 1200) -> bytes:
+    """A distinct JPEG per call, so /vision never answers from its cache."""
+    from PIL import Image
+
+    noise = Image.frombytes("L", (width // 16, height // 16), rng.randbytes(width * height // 256))
+    img = Image.merge("RGB", [noise.resize((width, height), Image.BICUBIC)] * 3)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+async def http_benchmarks(args) -> dict:
+    fake = dict(latency=args.latency, jitter=args.jitter, reply_words=args.reply_words,
+                error_rate=args.error_rate, seed=5)
+    rng = random.Random(5)
+    photos = [small_photo(rng) for _ in range(args.vision_requests)]
+
+    async with offline_app(**fake) as client:
+        async def chat(i):
+            headers = {"X-Session-Id": f"suite-client-{i % args.concurrency:04d}"}
+            return await client.post("/chat", json={"text": f"suite prompt {i}"}, headers=headers)
+
+        async def vision(i):
+            files = {"file": (f"photo{i}.jpg", photos[i], "image/jpeg")}
+            return await client.post("/vision", files=files)
+
+        # Warm-up: first requests pay for imports, the prompt cache, etc.
+        await drive(args.concurrency, args.concurrency, chat)
+        return {
+            "chat": await drive(args.chat_requests, args.concurrency, chat),
+            "vision": await drive(args.vision_requests, min(args.concurrency, 8), vision),
+        }
+
+
+def timed(fn, repeat: int) -> float:
+    """Median milliseconds per call over `repeat` calls."""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(percentile(samples, 50), 4)
+
+
+def memory_benchmarks(size: int, repeat: int, words: list, rng) -> dict:
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    memory = MemoryManager(flush_interval=0)
+
+    start = time.perf_counter()
+    for i in range(size):
+        profile = MemoryManager.PROFILES[i % len(MemoryManager.PROFILES)]
+        memory.add_memory(profile, " ".join(rng.choices(words, k=8)) + f" #{i}")
+    seed_s = time.perf_counter() - start
+    memory.save_all()
+
+    queries = [" ".join(rng.choices(words, k=4)) for _ in range(repeat)]
+    result = {
+        "seed_items_per_s": round(size / seed_s),
+        "add_memory_ms": timed(lambda i: memory.add_memory("general", f"fresh note {i} {words[i]}"), repeat),
+        # One removal per call, plus the full scan to find it
+        "forget_matching_ms": timed(lambda i: memory.forget_matching(f"fresh note {i} "), repeat),
+        "build_memory_context_ms": timed(
+            lambda i: memory.build_memory_context("general", query=queries[i]), repeat),
+    }
+
+    def one_save(i):
+        memory.add_memory(MemoryManager.PROFILES[i % 5], f"dirty note {i}")
+        memory.save_all()
+
+    # add_memory is ~free next to the write, so this is the cost of a flush
+    result["save_all_ms"] = timed(one_save, max(3, repeat // 10))
+    memory.close()
+    return result
+
+
+def current_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old: dict, new: dict):
+    before, after = flatten(old["results"]), flatten(new["results"])
+    print(f"\n{'metric':<46} {old['commit']:>12} {new['commit']:>12} {'change':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key], after[key]
+        change = f"{(b - a) / a:+.1%}" if a else "n/a"
+        print(f"{key:<46} {a:>12g} {b:>12g} {change:>8}")
+
+
+async def main(args):
+    results = {}
+    if not args.skip_http:
+        print("-- http")
+        results["http"] = await http_benchmarks(args)
+        for endpoint, r in results["http"].items():
+            print(f"{endpoint:>8}: {r['rps']:7.1f} req/s  p50 {r['p50_ms']:7.1f}  p95 {r['p95_ms']:7.1f}  "
+                  f"p99 {r['p99_ms']:7.1f} ms  {r['errors']} errors")
+
+    if not args.skip_memory:
+        print("-- memory")
+        rng = random.Random(9)
+        words = vocabulary(20000, rng)
+        results["memory"] = {}
+        for size in args.sizes:
+            r = memory_benchmarks(size, args.repeat, words, rng)
+            results["memory"][str(size)] = r
+            print(f"{size:>8}: add {r['add_memory_ms']:.3f}  forget {r['forget_matching_ms']:.3f}  "
+                  f"context {r['build_memory_context_ms']:.3f}  save_all {r['save_all_ms']:.3f} ms")
+
+    report = {
+        "commit": current_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--chat-requests", type=int, default=500)
+    parser.add_argument("--vision-requests", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.1, help="median fake model latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="lognormal sigma of the latency")
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--quick", action="store_true", help="smaller run for a fast check")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument("--out", help="where to write the JSON (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+    # The benchmarks chdir into scratch directories
+    args.out = args.out and os.path.abspath(args.out)
+    args.compare = args.compare and os.path.abspath(args.compare)
+    if args.quick:
+        args.chat_requests, args.vision_requests = 100, 10
+        args.sizes, args.repeat = [1000, 10000], 20
+    asyncio.run(main(args))
@@ -0,0 +1,92 @@
+"""
+Summariser input tokens per run: full-transcript summaries vs incremental rolling ones.
+
+Plays a long conversation through Copilot with FakeModel (replies of
+--reply-words words). The old policy rebuilt a transcript of the whole
+(trimmed) history every 15 turns and overwrote the one summary; the
+incremental one sends only the turns since the last summary plus the
+latest summary, and condenses older summaries into higher levels. Reports
+input tokens per summariser call for both and the final summary hierarchy.
+
+    python -m benchmarks.summarise --turns 600
+"""
+import argparse
+import os
+import random
+import tempfile
+from collections import Counter
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import vocabulary
+from agent import Copilot
+from context import count_tokens
+from fake_model import FakeModel
+from summariser import SummaryWorker, transcript
+
+
+def legacy_prompt(history: list) -> str:
+    """The pre-incremental prompt: every message still in history."""
+    return (
+        "You are a neutral summariser.\n"
+        "Summarise the following conversation in 5–10 bullet points.\n"
+        "Focus on: user preferences, facts, decisions, goals, and ongoing tasks.\n"
+        "Do NOT imitate any persona or style. Write neutrally.\n\n"
+        f"Conversation:\n{transcript(history)}"
+    )
+
+
+def legacy(messages: list) -> list:
+    """Prompt tokens of each summary under the every-15-turns policy."""
+    history, calls = [], []
+    for turn, (user, reply) in enumerate(messages, 1):
+        history += [{"role": "user", "parts": [user]}, {"role": "model", "parts": [reply]}]
+        if turn % 15 == 0 and len(history) >= 10:
+            calls.append(count_tokens(legacy_prompt(history)))
+            history = history[-20:]
+    return calls
+
+
+def incremental(messages: list, model) -> tuple:
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    worker = SummaryWorker(model)
+    bot = Copilot(model=model, summariser=worker)
+    calls = []
+    for user, _ in messages:
+        before = worker.input_tokens, worker.completed + worker.condensed
+        bot.run(user)
+        worker.drain()  # one job at a time, so each call is measured on its own
+        if worker.completed + worker.condensed > before[1]:
+            calls.append((worker.input_tokens - before[0]) / (worker.completed + worker.condensed - before[1]))
+    levels = Counter(entry["level"] for entry in bot.memory.summaries)
+    worker.close()
+    bot.memory.close()
+    return calls, levels
+
+
+def stats(calls: list) -> str:
+    if not calls:
+        return "no calls"
+    head, tail = calls[:len(calls) // 4] or calls, calls[-(len(calls) // 4 or 1):]
+    return (f"{len(calls):4d} calls, {sum(calls):8.0f} tokens total, per call: mean {sum(calls) / len(calls):6.0f}  "
+            f"max {max(calls):6.0f}  first quarter {sum(head) / len(head):6.0f}  last quarter {sum(tail) / len(tail):6.0f}")
+
+
+def main(args):
+    rng = random.Random(5)
+    words = vocabulary(5000, rng)
+    model = FakeModel(latency=0, reply_words=args.reply_words)
+    messages = [(" ".join(rng.choices(words, k=args.user_words)), model.reply) for _ in range(args.turns)]
+
+    print(f"{args.turns} turns, ~{args.user_words} words asked / {args.reply_words} words replied per turn")
+    print(f"{'full transcript':>16}: {stats(legacy(messages))}")
+    calls, levels = incremental(messages, model)
+    print(f"{'incremental':>16}: {stats(calls)}")
+    print(f"{'':>16}  summaries kept by level: {dict(sorted(levels.items()))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=600)
+    parser.add_argument("--user-words", type=int, default=25)
+    parser.add_argument("--reply-words", type=int, default=60)
+    main(parser.parse_args())
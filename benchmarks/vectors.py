@@ -0,0 +1,90 @@
+"""
+Semantic (hashed n-gram) recall vs BM25, and what it costs per turn.
+
+Each query is built from a stored item by inflecting two of its words
+("revise" -> "revising", "mate" -> "mates"), which exact-term BM25
+cannot match. Reports recall@k for both indexes, the latency of
+VectorIndex.search at N items, and build_memory_context (the per-turn
+cost) with and without the vector index.
+
+    python -m benchmarks.vectors --items 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from benchmarks.retrieval import percentile, vocabulary
+# Semantic recall is opt-in
+os.environ["COPILOT_SEMANTIC_MEMORY"] = "1"
+
+from memory_manager import MemoryManager  # noqa: E402
+
+SUFFIXES = ("s", "ing", "ed", "er")
+
+
+def inflect(word: str, rng) -> str:
+    return word + rng.choice(SUFFIXES)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    os.chdir(tempfile.mkdtemp(prefix="copilot-bench-"))
+    words = vocabulary(20000, rng)
+
+    memory = MemoryManager()
+    if memory.vectors is None:
+        raise SystemExit("NumPy is not installed; semantic recall is disabled.")
+    texts = []
+    start = time.perf_counter()
+    for i in range(args.items):
+        text = " ".join(rng.sample(words, rng.randint(5, 10)))
+        texts.append(text)
+        memory.add_memory(MemoryManager.PROFILES[i % 5], text)
+    build = time.perf_counter() - start
+    memory.flush_interval = 0
+
+    hits = {"bm25": 0, "vector": 0, "fused": 0}
+    samples = []
+    queries = []
+    for _ in range(args.queries):
+        target = rng.choice(texts)
+        query = " ".join(inflect(w, rng) for w in rng.sample(target.split(), 2))
+        queries.append(query)
+        found = {
+            "bm25": [item["text"] for _, _, (_, item) in memory.index.search(query, args.k)],
+            "fused": [item["text"] for _, item in memory.search(query, args.k)],
+        }
+        t = time.perf_counter()
+        results = memory.vectors.search(query, args.k)
+        samples.append((time.perf_counter() - t) * 1000)
+        found["vector"] = [item["text"] for _, _, (_, item) in results]
+        for name, texts_found in found.items():
+            hits[name] += target in texts_found
+
+    for name, n in hits.items():
+        print(f"recall@{args.k} {name:>7}: {n / args.queries:.2%}")
+    print(f"vector search at {args.items} items: p50 {statistics.median(samples):.3f} ms  "
+          f"p95 {percentile(samples, 95):.3f} ms")
+    print(f"indexed in {build:.2f} s ({build / args.items * 1e6:.1f} us per add_memory)")
+
+    vectors = memory.vectors
+    for label in ("with vectors", "BM25 only"):
+        turn = []
+        for query in queries:
+            t = time.perf_counter()
+            memory.build_memory_context("general", query=query)
+            turn.append((time.perf_counter() - t) * 1000)
+        print(f"build_memory_context {label:>12}: p50 {statistics.median(turn):.3f} ms  "
+              f"p99 {percentile(turn, 99):.3f} ms")
+        memory.vectors = None
+    memory.vectors = vectors
@@ -0,0 +1,171 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+
+from retrieval import tokenize
+
+# Checked in this order: the first profile with a keyword hit wins.
+# Matched as whole words (plus an optional plural "s"/"es"), so "bro" no
+# longer fires on "brother" nor "test" on "latest".
+DEFAULT_KEYWORDS = {
+    "school": ("exam", "test", "gcse", "school", "teacher", "class", "homework", "revision"),
+    "relationships": ("friend", "crush", "gf", "boyfriend", "girlfriend", "relationship",
+                      "mate", "bro", "pooks", "people"),
+    "goals": ("goal", "aim", "dream", "plan", "future", "i want to", "my target", "my goal"),
+    "knowledge": ("fact", "definition", "means", "stands for", "is called", "is when"),
+}
+
+DEFAULT_PROFILE = "general"
+
+
+def load_keywords(path: str = None) -> dict:
+    """Keyword tables from a JSON file ({profile: [keywords]}, in priority order), else the defaults."""
+    path = path or os.getenv("COPILOT_CLASSIFIER_KEYWORDS")
+    if not path:
+        return DEFAULT_KEYWORDS
+    try:
+        with open(path, "r") as f:
+            return {profile: tuple(words) for profile, words in json.load(f).items()}
+    except Exception as e:
+        print(f"Failed to load classifier keywords from {path}, using defaults:", e)
+        return DEFAULT_KEYWORDS
+
+
+class NaiveBayes:
+    """
+    Multinomial naive Bayes over retrieval.tokenize() terms with add-one
+    smoothing, trained locally from already-classified memories. Used only
+    for texts no keyword matches, and only when it is confident.
+    """
+
+    def __init__(self, min_confidence: float = 0.8, min_examples: int = 50):
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.term_counts = {}  # label -> Counter
+        self.totals = {}  # label -> number of terms
+        self.docs = Counter()  # label -> number of documents
+        self.vocabulary = set()
+
+    def fit(self, examples):
+        """examples: iterable of (text, label)."""
+        for text, label in examples:
+            terms = tokenize(text)
+            self.term_counts.setdefault(label, Counter()).update(terms)
+            self.totals[label] = self.totals.get(label, 0) + len(terms)
+            self.docs[label] += 1
+            self.vocabulary.update(terms)
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return sum(self.docs.values()) >= self.min_examples and len(self.docs) > 1
+
+    def predict(self, text: str):
+        """Most likely label, or None when untrained or not confident enough."""
+        terms = [t for t in tokenize(text) if t in self.vocabulary]
+        if not terms or not self.ready:
+            return None
+        n_docs = sum(self.docs.values())
+        vocab = len(self.vocabulary)
+        scores = {}
+        for label, counts in self.term_counts.items():
+            denom = self.totals[label] + vocab
+            score = math.log(self.docs[label] / n_docs)
+            for term in terms:
+                score += math.log((counts[term] + 1) / denom)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax probability of the winner
+        top = scores[best]
+        prob = 1.0 / sum(math.exp(s - top) for s in scores.values())
+        return best if prob >= self.min_confidence else None
+
+
+def trie_pattern(words) -> str:
+    """
+    Regex alternation for `words` factored into a character trie
+    ("b(?:oyfriend|ro)" rather than "boyfriend|bro"), so the regex engine
+    rejects most positions on the first character instead of trying every
+    keyword in turn. Spaces inside phrases match any run of whitespace.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [(r"\s+" if ch == " " else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+class Classifier:
+    """
+    Picks the memory profile for a piece of text.
+    All keyword tables are compiled into one word-boundary regex, so a text
+    is scanned once however many keywords there are.
+    """
+
+    def __init__(self, keywords: dict = None, default: str = DEFAULT_PROFILE, bayes: NaiveBayes = None):
+        self.keywords = keywords or load_keywords()
+        self.default = default
+        self.bayes = bayes
+
+        self.profiles = list(self.keywords)
+        self.priority = {}  # keyword -> rank of the first profile listing it
+        for rank, words in enumerate(self.keywords.values()):
+            for word in words:
+                self.priority.setdefault(" ".join(word.lower().split()), rank)
+        self.pattern = re.compile(r"\b(" + trie_pattern(self.priority) + r")(?:e?s)?\b")
+
+    def _rank(self, keyword: str) -> int:
+        rank = self.priority.get(keyword)
+        if rank is None:  # a phrase matched across other whitespace
+            rank = self.priority[" ".join(keyword.split())]
+        return rank
+
+    def _fallback(self, text: str) -> str:
+        if self.bayes is not None:
+            label = self.bayes.predict(text)
+            if label is not None:
+                return label
+        return self.default
+
+    def classify(self, text: str) -> str:
+        best = None
+        for keyword in self.pattern.findall(text.lower()):
+            rank = self._rank(keyword)
+            if rank == 0:
+                return self.profiles[0]
+            if best is None or rank < best:
+                best = rank
+        return self.profiles[best] if best is not None else self._fallback(text)
+
+    def classify_many(self, texts: list) -> list:
+        """
+        classify() for a batch. Deliberately a loop: one pass over the joined
+        texts was slower, as it loses classify()'s early exit on a top-rank
+        keyword and has to map every match back to its text.
+        """
+        classify = self.classify
+        return [classify(text) for text in texts]
+
+    def train(self, memories: dict, **options):
+        """Fit the naive Bayes fallback on {profile: [items]} (e.g. MemoryManager.memories)."""
+        self.bayes = NaiveBayes(**options).fit(
+            (item.get("text", ""), profile)
+            for profile, items in memories.items()
+            for item in items
+        )
+        return self.bayes
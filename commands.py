@@ -0,0 +1,65 @@
+import os
+import re
+
+# Personas defined in prompts.AGENT_INSTRUCTION ("Switch to X")
+PERSONAS = ("Ayanokoji", "Butler", "User", "Hybrid", "Assistant")
+DEFAULT_PERSONA = os.getenv("COPILOT_PERSONA", "Assistant")
+
+# Local task confirmations, in each persona's voice (see the persona profiles)
+TASK_CONFIRMATIONS = {
+    "Ayanokoji": "Understood.",
+    "Butler": "Will do, Sir.",
+    "User": "Alr, got it.",
+    "Hybrid": "Alr. It’s handled.",
+    "Assistant": "Okay, let’s sort this.",
+}
+
+# Text after a state command goes on to the model, but only after a clear
+# separator ("Switch to Butler, what's next?"): "switch to user accounts" is chat
+_REST = r"(?:\s*[,.!?:;]\s*(.*))?"
+_END = r"[\s.!?]*"
+
+# Every command SESSION_INSTRUCTION advertises, as (handler name, pattern).
+# Patterns match the whole (stripped, case-insensitive) message; the first
+# one that matches wins and its groups are the handler's arguments.
+COMMANDS = [
+    ("persona", r"switch to (" + "|".join(PERSONAS) + ")" + _REST),
+    ("filter_on", r"(?:no filter on|go unfiltered|answer with no filter)" + _REST),
+    ("filter_off", r"(?:no filter off|normal filter|back to normal)" + _REST),
+    ("switch_profile", r"switch profile:\s*(.*)"),
+    ("wipe", r"(?:wipe|reset|wipe all) memory" + _END),
+    ("list_memories", r"(?:list|show) memories" + _END),
+    ("memory_summary", r"(?:summari[sz]e memory|memory summary)" + _END),
+    ("add_task", r"(remember )?task:\s*(.*\S)"),
+    ("list_tasks", r"(?:list|show) tasks" + _END),
+    ("clear_tasks", r"clear tasks" + _END),
+    ("remember", r"remember(?: this)?:\s*(.*)"),
+    ("forget", r"forget:\s*(.*)"),
+]
+
+
+class CommandRouter:
+    """
+    All commands compiled into one anchored alternation, so routing a
+    message is a single regex pass however many commands there are.
+    match() returns (handler name, args) or None for ordinary chat.
+    """
+
+    def __init__(self, commands: list = COMMANDS):
+        self.pattern = re.compile(
+            "|".join(f"(?P<{name}>{pattern})" for name, pattern in commands),
+            re.IGNORECASE | re.DOTALL,
+        )
+        # handler -> (index of its first argument in groups(), number of arguments)
+        self.args = {name: (self.pattern.groupindex[name], re.compile(pattern).groups)
+                     for name, pattern in commands}
+
+    def match(self, text: str):
+        m = self.pattern.fullmatch(text.strip())
+        if m is None:
+            return None
+        start, count = self.args[m.lastgroup]
+        return m.lastgroup, m.groups()[start:start + count]
+
+
+ROUTER = CommandRouter()
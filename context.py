@@ -0,0 +1,95 @@
+import os
+import re
+from functools import lru_cache
+
+# Words, numbers, and runs of the same punctuation / symbol character
+PIECE_RE = re.compile(r"[A-Za-z]+|[0-9]+|([^\sA-Za-z0-9])\1*")
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Local approximation of the model tokenizer: one token per punctuation
+    run or digit run, and one token per ~5 letters of each word.
+    Cached by text, so each history message is only counted once.
+    """
+    tokens = 0
+    for match in PIECE_RE.finditer(text):
+        piece = match.group()
+        tokens += max(1, (len(piece) + 2) // 5) if piece.isalpha() else 1
+    return tokens
+
+
+def message_tokens(msg: dict) -> int:
+    # A few tokens of per-message framing (role markers etc.)
+    return 4 + sum(count_tokens(p) for p in msg.get("parts", []) if isinstance(p, str))
+
+
+class ContextAssembler:
+    """
+    Builds the `contents` sent to the model each turn within an input
+    token budget: the persona prompt and memory block always go in,
+    then history is filled newest-first until the budget runs out.
+    Older turns that don't fit are condensed into a one-line note
+    (the background summary covers what they said).
+    """
+
+    def __init__(self, budget: int = None, min_messages: int = 2):
+        self.budget = budget or int(os.getenv("COPILOT_INPUT_BUDGET", "24000"))
+        self.min_messages = min_messages
+
+    def assemble(self, system_prompt: str, memory_text: str, history: list,
+                 inline_system: bool = True, session_state: str = ""):
+        """
+        Return (contents, report) where report is the per-section token breakdown.
+        With inline_system=False the persona prompt is served as a (cached)
+        system instruction, so contents open with the memory block instead;
+        it still counts against the budget since the model sees it.
+        `session_state` (active persona, filter) is appended to the memory
+        block and counts as memory.
+        """
+        if session_state:
+            memory_text = f"{memory_text}\n\n[SESSION STATE]\n{session_state}"
+        persona_tokens = count_tokens(system_prompt)
+        memory_tokens = count_tokens(memory_text)
+        remaining = self.budget - persona_tokens - memory_tokens
+
+        # Walk back from the newest message while it still fits
+        start = len(history)
+        history_tokens = 0
+        while start > 0:
+            cost = message_tokens(history[start - 1])
+            kept = len(history) - start
+            if cost > remaining - history_tokens and kept >= self.min_messages:
+                break
+            history_tokens += cost
+            start -= 1
+
+        # Don't open on a dangling model reply
+        while start < len(history) - 1 and history[start].get("role") != "user":
+            history_tokens -= message_tokens(history[start])
+            start += 1
+
+        setup = "[NEUTRAL MEMORY CONTEXT]\n" + memory_text
+        if inline_system:
+            setup = system_prompt + "\n\n" + setup
+        if start:
+            note = (
+                f"\n\n[EARLIER CONVERSATION]\n{start} older message(s) omitted to stay "
+                "within the context budget; rely on the conversation summary for them."
+            )
+            setup += note
+            memory_tokens += count_tokens(note)
+
+        contents = [{"role": "user", "parts": [setup]}] + history[start:]
+        report = {
+            "persona": persona_tokens,
+            "persona_cached": not inline_system,
+            "memory": memory_tokens,
+            "history": history_tokens,
+            "total": persona_tokens + memory_tokens + history_tokens,
+            "budget": self.budget,
+            "history_messages": len(history) - start,
+            "dropped_messages": start,
+        }
+        return contents, report
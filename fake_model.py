@@ -0,0 +1,178 @@
+import asyncio
+import random
+import time
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+import prompt_cache
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStream:
+    """Async iterator of FakeResponse chunks, like a streamed Gemini response."""
+
+    def __init__(self, chunks, chunk_delay: float):
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield FakeResponse(chunk)
+
+
+class FakeModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+    Sleeps for `latency` seconds per call and returns a canned reply,
+    so the server can be exercised offline without touching the API.
+    With stream=True the first chunk arrives after `latency` and each
+    following word after `chunk_delay`.
+    Fault injection: a fraction `error_rate` of calls fail with a 503/429,
+    and a fraction `tail_rate` take `tail_latency` instead of `latency`.
+    `jitter` > 0 draws each latency from a lognormal around `latency`
+    (sigma = jitter); `reply_words` replaces the reply with that many words.
+    """
+
+    def __init__(self, model_name: str = "models/fake", latency: float = 0.2,
+                 reply: str = "Understood.", chunk_delay: float = 0.0,
+                 system_instruction: str = None, cached_content: str = None,
+                 error_rate: float = 0.0, tail_rate: float = 0.0, tail_latency: float = 2.0,
+                 jitter: float = 0.0, reply_words: int = None, seed: int = None, **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.rng = random.Random(seed)
+        self.errors = 0
+        self.reply = reply
+        if reply_words:
+            self.reply = " ".join(f"word{i % 97}" for i in range(reply_words))
+        self.chunk_delay = chunk_delay
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+        self.calls = 0
+        self.last_contents = None
+
+    def _chunks(self):
+        words = self.reply.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _delay(self) -> float:
+        if self.rng.random() < self.tail_rate:
+            return self.tail_latency
+        if self.jitter:
+            return self.latency * self.rng.lognormvariate(0, self.jitter)
+        return self.latency
+
+    def _maybe_fail(self):
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            if self.rng.random() < 0.5:
+                raise api_exceptions.ServiceUnavailable("fake: model overloaded")
+            raise api_exceptions.ResourceExhausted("fake: quota exceeded")
+
+    def generate_content(self, contents=None, stream: bool = False, **kwargs):
+        self.calls += 1
+        self.last_contents = contents
+        time.sleep(self._delay())
+        self._maybe_fail()
+        if stream:
+            return [FakeResponse(c) for c in self._chunks()]
+        time.sleep(self.chunk_delay * (len(self._chunks()) - 1))
+        return FakeResponse(self.reply)
+
+    async def generate_content_async(self, contents=None, stream: bool = False, **kwargs):
+        self.calls += 1
+        self.last_contents = contents
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        if stream:
+            return FakeStream(self._chunks(), self.chunk_delay)
+        await asyncio.sleep(self.chunk_delay * (len(self._chunks()) - 1))
+        return FakeResponse(self.reply)
+
+
+class FakeCachedContent:
+    def __init__(self, name: str, display_name: str, system_instruction: str, expires_at: float):
+        self.name = name
+        self.display_name = display_name
+        self.system_instruction = system_instruction
+        self.expires_at = expires_at
+
+
+class FakeCacheBackend:
+    """
+    In-memory stand-in for Gemini context caching (see prompt_cache.py).
+    Caches expire by `clock`; refreshing an expired one fails like the API
+    does, and `fail_create` simulates prompts the API refuses to cache.
+    find / create / refresh block for `call_latency` seconds, like the SDK.
+    """
+
+    def __init__(self, clock=time.time, fail_create: bool = False, call_latency: float = 0,
+                 **model_options):
+        self.clock = clock
+        self.fail_create = fail_create
+        self.call_latency = call_latency
+        self.model_options = model_options
+        self.caches = {}
+        self.created = 0
+        self.deleted = 0
+
+    def _live(self, handle) -> bool:
+        return handle.name in self.caches and handle.expires_at > self.clock()
+
+    def find(self, display_name: str):
+        time.sleep(self.call_latency)
+        for handle in self.caches.values():
+            if handle.display_name == display_name and self._live(handle):
+                return handle
+        return None
+
+    def create(self, model_name: str, system_instruction: str, display_name: str, ttl: float):
+        time.sleep(self.call_latency)
+        if self.fail_create:
+            raise RuntimeError("cached content is below the minimum token count")
+        self.created += 1
+        handle = FakeCachedContent(f"cachedContents/fake-{self.created}", display_name,
+                                   system_instruction, self.clock() + ttl)
+        self.caches[handle.name] = handle
+        return handle
+
+    def refresh(self, handle, ttl: float):
+        time.sleep(self.call_latency)
+        if not self._live(handle):
+            raise RuntimeError(f"{handle.name} not found")
+        handle.expires_at = self.clock() + ttl
+
+    def delete(self, handle):
+        self.deleted += 1
+        self.caches.pop(handle.name, None)
+
+    def model(self, handle):
+        return FakeModel(system_instruction=handle.system_instruction,
+                         cached_content=handle.name, **self.model_options)
+
+    def plain(self, model_name: str, system_instruction: str):
+        return FakeModel(model_name, system_instruction=system_instruction, **self.model_options)
+
+
+def install(**options):
+    """
+    Replace genai.GenerativeModel and the prompt cache backend so every
+    model created afterwards (agent.py, server.py) is a FakeModel built
+    with `options`. Must be called before importing server.
+    """
+    def factory(model_name: str = "models/fake", **kwargs):
+        return FakeModel(model_name, **{**options, **kwargs})
+
+    genai.GenerativeModel = factory
+    prompt_cache.default_backend = lambda: FakeCacheBackend(**options)
+    return factory
@@ -0,0 +1,141 @@
+import io
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+try:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_UPLOAD_BYTES = int(os.getenv("COPILOT_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Room for the multipart framing (boundaries, part headers) around the image
+FORM_OVERHEAD = 64 * 1024
+MAX_SIDE = int(os.getenv("COPILOT_IMAGE_MAX_SIDE", "1536"))
+JPEG_QUALITY = int(os.getenv("COPILOT_IMAGE_QUALITY", "85"))
+
+# Refuse decompression bombs well before they exhaust memory
+Image.MAX_IMAGE_PIXELS = 60_000_000
+
+# Pillow releases the GIL while decoding / resizing / encoding
+_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="image")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class BadImage(Exception):
+    pass
+
+
+def _too_large(max_bytes: int) -> UploadTooLarge:
+    return UploadTooLarge(f"Image is larger than {max_bytes // (1024 * 1024)} MB.")
+
+
+async def read_upload(stream, content_type: str, field: str = "file",
+                      max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    The contents of multipart form field `field`, parsed straight off the
+    request body stream (request.stream()). Reading stops with
+    UploadTooLarge as soon as the body passes max_bytes plus framing, so
+    an oversized upload is never read in full or spooled to disk.
+    """
+    mime, params = parse_options_header(content_type or "")
+    boundary = params.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise BadImage("Expected a multipart/form-data upload.")
+
+    part = {"headers": {}, "field": b"", "value": b"", "wanted": False}
+    received = bytearray()
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["wanted"] = options.get(b"name") == field.encode()
+        part["headers"] = {}
+
+    def on_part_data(data, start, end):
+        if part["wanted"]:
+            received.extend(memoryview(data)[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    total = 0
+    async for chunk in stream:
+        total += len(chunk)
+        if total > max_bytes + FORM_OVERHEAD:
+            raise _too_large(max_bytes)
+        try:
+            parser.write(chunk)
+        except MultipartParseError as e:
+            raise BadImage(f"Malformed upload: {e}")
+    parser.finalize()
+
+    data = bytes(received)
+    if not data:
+        raise BadImage(f"No '{field}' field in the upload.")
+    if len(data) > max_bytes:
+        raise _too_large(max_bytes)
+    return data
+
+
+def preprocess(data: bytes, max_side: int = MAX_SIDE, quality: int = JPEG_QUALITY):
+    """
+    Decode, apply the EXIF orientation, downscale so the longest side is at
+    most max_side, and re-encode without metadata: JPEG for opaque images,
+    WebP when there is transparency.
+    Returns (bytes, mime_type, report).
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        original_size = img.size
+        # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, which is far cheaper;
+        # ask for the final thumbnail size so the reduced decode still covers it
+        scale = min(1.0, max_side / max(img.size))
+        img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+        img = ImageOps.exif_transpose(img)
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise BadImage(f"Could not read image: {e}")
+
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    out = io.BytesIO()
+    if has_alpha:
+        img.convert("RGBA").save(out, format="WEBP", quality=quality, method=4)
+        mime = "image/webp"
+    else:
+        img.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True)
+        mime = "image/jpeg"
+    encoded = out.getvalue()
+
+    report = {
+        "bytes_in": len(data),
+        "bytes_sent": len(encoded),
+        "original_size": list(original_size),
+        "sent_size": list(img.size),
+        "mime_type": mime,
+    }
+    return encoded, mime, report
+
+
+async def preprocess_async(data: bytes, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, lambda: preprocess(data, **kwargs))
@@ -0,0 +1,216 @@
+"""
+Bulk import / export of long-term memory as JSON Lines.
+
+One item per line: {"profile": "school", "text": "...", "source": "user", ...}.
+Rows without a (known) profile are classified; a bare JSON string is
+taken as the text. Everything is streamed with generators in batches,
+so files of any size go through in constant memory:
+
+    python -m memory_io export > backup.jsonl
+    python -m memory_io export --profile school -o school.jsonl
+    python -m memory_io import backup.jsonl
+
+The server exposes the same as GET /memory/export and POST /memory/import.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+from itertools import islice
+
+from metrics import stage
+
+BATCH_SIZE = int(os.getenv("COPILOT_IMPORT_BATCH", "2000"))
+
+# Keys the importing store assigns itself
+DROPPED_KEYS = ("id", "profile")
+
+MAX_ERRORS_REPORTED = 10
+
+# Longest line accepted from an HTTP upload, so one bad row can't fill memory
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+def batched(iterable, size: int):
+    """Lists of up to `size` consecutive elements."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_line(line) -> dict:
+    """One JSONL row as a dict with at least a non-empty "text"; raises ValueError otherwise."""
+    row = json.loads(line)
+    if isinstance(row, str):
+        row = {"text": row}
+    if not isinstance(row, dict):
+        raise ValueError("expected an object or a string")
+    text = row.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('missing "text"')
+    return row
+
+
+def new_report() -> dict:
+    return {"imported": 0, "classified": 0, "skipped": 0, "evicted": 0, "errors": [], "profiles": {}}
+
+
+def finish_report(report: dict) -> dict:
+    """Warn when retention dropped items to make room for the import."""
+    if report["evicted"]:
+        report["warning"] = (
+            f"{report['evicted']} item(s) were evicted to keep profiles within their retention "
+            "capacity (COPILOT_MEMORY_CAPACITY / COPILOT_MEMORY_RETENTION)."
+        )
+        print(report["warning"])
+    return report
+
+
+def import_batch(memory, lines: list, report: dict, first_line: int = 1, source: str = "import"):
+    """
+    Parse, classify and add one batch of JSONL lines, updating `report`.
+    Rows whose profile is missing or unknown are classified together
+    with one classify_many() call.
+    """
+    parsed = []
+    for n, line in enumerate(lines, first_line):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            report["skipped"] += 1
+            continue
+        try:
+            parsed.append(parse_line(line))
+        except ValueError as e:
+            report["skipped"] += 1
+            if len(report["errors"]) < MAX_ERRORS_REPORTED:
+                report["errors"].append(f"line {n}: {e}")
+
+    unlabelled = [row for row in parsed if row.get("profile") not in memory.PROFILES]
+    if unlabelled:
+        with stage("import_classify"):
+            for row, profile in zip(unlabelled, memory.classify_many([r["text"] for r in unlabelled])):
+                row["profile"] = profile
+        report["classified"] += len(unlabelled)
+
+    rows = []
+    for row in parsed:
+        profile = row["profile"]
+        item = {k: v for k, v in row.items() if k not in DROPPED_KEYS}
+        item.setdefault("source", source)
+        rows.append((profile, item))
+    with stage("import_write"):
+        added, evicted = memory.add_many(rows)
+    report["imported"] += len(rows)
+    report["evicted"] += sum(evicted.values())
+    for profile, n in added.items():
+        report["profiles"][profile] = report["profiles"].get(profile, 0) + n
+
+
+def import_jsonl(memory, lines, batch_size: int = BATCH_SIZE, source: str = "import") -> dict:
+    """Import an iterable of JSONL lines (e.g. an open file) batch by batch, then flush once."""
+    report = new_report()
+    line_no = 1
+    for batch in batched(lines, batch_size):
+        import_batch(memory, batch, report, line_no, source)
+        line_no += len(batch)
+    memory.save_all()
+    return finish_report(report)
+
+
+async def aiter_lines(chunks, max_line: int = MAX_LINE_BYTES):
+    """Split an async stream of byte chunks (e.g. a request body) into lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > max_line:
+            raise LineTooLong(f"A line is longer than {max_line} bytes.")
+    if buffer:
+        yield buffer
+
+
+async def import_stream(memory, chunks, batch_size: int = BATCH_SIZE, source: str = "import") -> dict:
+    """import_jsonl() for an async byte stream; each batch is processed off the event loop."""
+    report = new_report()
+    line_no = 1
+    batch = []
+    async for line in aiter_lines(chunks):
+        batch.append(line)
+        if len(batch) >= batch_size:
+            await asyncio.to_thread(import_batch, memory, batch, report, line_no, source)
+            line_no += len(batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(import_batch, memory, batch, report, line_no, source)
+    await asyncio.to_thread(memory.save_all)
+    return finish_report(report)
+
+
+def export_jsonl(memory, profiles=None):
+    """
+    Yield every memory item as one JSONL line (with its profile), profile
+    by profile. Only a list of references per profile is copied, under
+    the lock, so concurrent adds / forgets don't disturb the iteration.
+    """
+    memory.sync()
+    for profile in profiles or memory.PROFILES:
+        with memory.lock:
+            items = list(memory.memories.get(profile, []))
+        for item in items:
+            yield json.dumps({"profile": profile, **item}, ensure_ascii=False) + "\n"
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export of long-term memory as JSON Lines.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write every memory item as JSONL")
+    export.add_argument("-o", "--output", default="-", help="file to write (default stdout)")
+    export.add_argument("--profile", action="append", help="only this profile (repeatable)")
+    imp = sub.add_parser("import", help="add items from a JSONL file")
+    imp.add_argument("input", nargs="?", default="-", help="file to read (default stdin)")
+    imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    imp.add_argument("--source", default="import", help='"source" for rows that have none')
+    args = parser.parse_args(argv)
+
+    from memory_manager import MemoryManager
+    from storage import StoreInUse
+    try:
+        memory = MemoryManager()
+    except StoreInUse as e:
+        # e.g. the server is running on a JSON store: use its HTTP endpoints instead
+        raise SystemExit(f"{e}\nOr use GET /memory/export and POST /memory/import on the running server.")
+    try:
+        if args.command == "export":
+            out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+            count = 0
+            for line in export_jsonl(memory, args.profile):
+                out.write(line)
+                count += 1
+            if out is not sys.stdout:
+                out.close()
+            print(f"Exported {count} memory item(s).", file=sys.stderr)
+        else:
+            source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+            report = import_jsonl(memory, source, args.batch_size, args.source)
+            if source is not sys.stdin:
+                source.close()
+            print(json.dumps(report, indent=2), file=sys.stderr)
+    finally:
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
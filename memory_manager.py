@@ -1,123 +1,502 @@
 import os
-import json
+import time
+import bisect
+import threading
+
+from storage import MEMORY_DIR, open_store
+from retrieval import BM25Index
+from context import count_tokens
+from vector_index import open_vector_index
+from metrics import stage
+from classifier import Classifier
+from retention import Retention, load_policies
 
-MEMORY_DIR = "memory"
 PROFILES = ["general", "school", "relationships", "goals", "knowledge"]
 
 
 class MemoryManager:
     PROFILES = PROFILES
 
-    def __init__(self):
+    def __init__(self, store=None, flush_interval: float = 0.5):
         os.makedirs(MEMORY_DIR, exist_ok=True)
+        # Guards in-memory state against the flush timer and background summariser
+        self.lock = threading.RLock()
+        # One flush at a time, so profile copies reach the disk in order (taken before `lock`)
+        self.save_lock = threading.Lock()
+
+        # Storage backend for profile items (see storage.py)
+        self.store = store or open_store(profiles=PROFILES)
         self.memories = {}
         for profile in PROFILES:
-            path = self._path(profile)
-            if os.path.exists(path):
-                try:
-                    with open(path, "r") as f:
-                        self.memories[profile] = json.load(f)
-                except Exception:
-                    self.memories[profile] = []
-            else:
-                self.memories[profile] = []
+            self.memories[profile] = self.store.load(profile)
+        self.next_id = 1
+        if not self.store.assigns_ids:
+            self._number_items()
 
-        self.summary_path = os.path.join(MEMORY_DIR, "summary.txt")
-        if os.path.exists(self.summary_path):
-            try:
-                with open(self.summary_path, "r") as f:
-                    self.summary = f.read()
-            except Exception:
-                self.summary = ""
-        else:
-            self.summary = ""
+        # Capacity / expiry per profile (see retention.py); pinned items are never evicted
+        self.retention = Retention(load_policies(PROFILES))
+        # Items whose usage stats changed since the last save, by profile
+        self.touched = {}
+
+        # Relevance index over every item, kept in step with each mutation
+        self.index = BM25Index()
+        for profile, items in self.memories.items():
+            for item in items:
+                self._index_add(profile, item)
+
+        # Optional semantic recall (None without NumPy)
+        self.vectors = open_vector_index()
+        if self.vectors is not None:
+            self.vectors.load(
+                (id(item), item.get("text", ""), (profile, item))
+                for profile, items in self.memories.items()
+                for item in items
+            )
+
+        # Keyword classifier, optionally with a naive Bayes fallback learnt from these memories
+        self.classifier = Classifier()
+        if os.getenv("COPILOT_CLASSIFIER_BAYES", "0") == "1":
+            self.classifier.train(self.memories)
+
+        # Rolling conversation summaries, oldest (most condensed) first; see summariser.py
+        self.summaries = []
+        self._load_summaries()
+
+        # Only profiles changed since the last save are rewritten
+        self.dirty = set()
+
+        # Debounced saving: at most one flush per `flush_interval` seconds
+        self.flush_interval = flush_interval
+        self.flush_timer = None
+        self.writes = 0
+
+        evicted = self.enforce_retention()
+        if evicted:
+            print(f"Evicted {evicted} memory item(s) over capacity or past their TTL.")
+            self.save_all()
+
+    def _number_items(self):
+        """
+        Give every item an id (and created_at) if it has none, e.g. files
+        written before items had them, and persist the result once so the
+        ids stay stable. Such legacy items from the user all came from an
+        explicit `remember:`, so they are pinned like new ones.
+        """
+        self.next_id = 1 + max((item.get("id") or 0 for items in self.memories.values() for item in items),
+                               default=0)
+        now = time.time()
+        for profile, items in self.memories.items():
+            numbered = False
+            for item in items:
+                if item.get("id") is None:
+                    item["id"] = self.next_id
+                    self.next_id += 1
+                    numbered = True
+                    if item.get("source") == "user":
+                        item["pinned"] = True
+                item.setdefault("created_at", now)
+            if numbered:
+                # Profiles are kept in id order (removals bisect on it)
+                items.sort(key=lambda item: item["id"])
+                self.store.rewrite(profile, items)
+
+    # ---------- INDEX ----------
+
+    def _index_add(self, profile: str, item: dict):
+        # Items are plain dicts, so their identity is the document id
+        self.index.add(id(item), item.get("text", ""), (profile, item))
+        self.retention.track(profile, item)
+
+    def _index_remove(self, item: dict):
+        self.index.remove(id(item))
+        if self.vectors is not None:
+            self.vectors.remove(id(item))
+        self.retention.untrack(item)
 
-    def _path(self, profile: str) -> str:
-        return os.path.join(MEMORY_DIR, f"{profile}.json")
+    def search(self, query: str, k: int = 8) -> list:
+        """
+        Top-k (profile, item) pairs across all profiles, most relevant first.
+        Keyword (BM25) and semantic rankings are merged by reciprocal rank.
+        """
+        rankings = [self.index.search(query, k)]
+        if self.vectors is not None:
+            rankings.append(self.vectors.search(query, k))
+        if len(rankings) == 1:
+            return [payload for _, _, payload in rankings[0]]
+
+        fused = {}
+        payloads = {}
+        for ranking in rankings:
+            for rank, (_, doc_id, payload) in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (60 + rank)
+                payloads[doc_id] = payload
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [payloads[doc_id] for doc_id in best]
 
     # ---------- SAVE / LOAD ----------
 
     def save_all(self):
-        for profile, items in self.memories.items():
-            path = self._path(profile)
-            try:
-                with open(path, "w") as f:
-                    json.dump(items, f, indent=2)
-            except Exception as e:
-                print(f"Failed to save memory for {profile}:", e)
+        """
+        Write every changed profile to disk now. Profiles the store
+        serialises in full are copied under the lock and written outside
+        it, so requests are not held up by the flush.
+        """
+        with self.save_lock, stage("save_all"):
+            copies = {}
+            with self.lock:
+                if self.flush_timer is not None:
+                    self.flush_timer.cancel()
+                    self.flush_timer = None
+
+                for profile, items in self.touched.items():
+                    try:
+                        self.store.record_touch(profile, list(items.values()))
+                    except Exception as e:
+                        print(f"Failed to save memory usage for {profile}:", e)
+                self.touched.clear()
+
+                for profile in sorted(self.dirty):
+                    items = self.memories.get(profile, [])
+                    if self.store.saves_copies:
+                        copies[profile] = [dict(item) for item in items]
+                    else:
+                        self._save(profile, items)
+                self.dirty.clear()
+
+                if self.vectors is not None:
+                    self.vectors.flush()
 
+            for profile, items in copies.items():
+                self._save(profile, items)
+
+    def _save(self, profile: str, items: list):
         try:
-            with open(self.summary_path, "w") as f:
-                f.write(self.summary)
+            self.store.save(profile, items)
+            self.writes += 1
         except Exception as e:
-            print("Failed to save summary:", e)
+            print(f"Failed to save memory for {profile}:", e)
 
-    def save_summary(self, summary_text: str):
-        self.summary = summary_text
+    def schedule_save(self):
+        """
+        Debounced save: changes are flushed by a timer at most once per
+        flush_interval, so a burst of turns costs a single write per profile.
+        """
+        with self.lock:
+            if not self.dirty and not self.touched:
+                return
+            if self.flush_interval > 0:
+                if self.flush_timer is None:
+                    self.flush_timer = threading.Timer(self.flush_interval, self.save_all)
+                    self.flush_timer.daemon = True
+                    self.flush_timer.start()
+                return
+        # save_all takes save_lock before the lock, so call it without the lock
+        self.save_all()
+
+    def close(self):
+        """Flush anything pending (call on shutdown)."""
+        self.save_all()
+        if self.vectors is not None:
+            self.vectors.close()
+        self.store.close()
+
+    def sync(self):
+        """
+        Apply adds / forgets (and summaries) made by other processes sharing
+        the store (SQLite with several workers). One cheap version check when
+        nothing changed; a no-op for single-process stores.
+        """
+        changes = getattr(self.store, "changes", None)
+        if changes is None:
+            return
+        with self.lock:
+            log = changes()
+            if log is None:
+                self._reload()
+                return
+            summaries_changed = False
+            for op, profile, payload in log:
+                if op == "summary":
+                    summaries_changed = True
+                    continue
+                items = self.memories.setdefault(profile, [])
+                if op == "delete":
+                    self._remove_ids(items, {payload})
+                    continue
+                # Our own adds come back through the log too: skip known ids
+                pos = bisect.bisect_left(items, payload["id"], key=lambda item: item.get("id", 0))
+                if pos < len(items) and items[pos].get("id") == payload["id"]:
+                    continue
+                items.insert(pos, payload)
+                self._index_add(profile, payload)
+                if self.vectors is not None:
+                    self.vectors.add(id(payload), payload.get("text", ""), (profile, payload))
+            if summaries_changed:
+                self._load_summaries()
+
+    def _reload(self):
+        """Rebuild everything from the store (we fell too far behind its change log)."""
+        self.index.clear()
+        if self.vectors is not None:
+            self.vectors.clear()
+        self.retention.clear()
+        for profile in PROFILES:
+            self.memories[profile] = self.store.load(profile)
+            for item in self.memories[profile]:
+                self._index_add(profile, item)
+                if self.vectors is not None:
+                    self.vectors.add(id(item), item.get("text", ""), (profile, item))
+        self._load_summaries()
+
+    # ---------- SUMMARIES ----------
+
+    # The rolling summaries live in the store (with SqliteStore, shared by
+    # every worker); `summaries` is a copy re-read whenever they change.
+
+    def _load_summaries(self):
+        """Re-read the summaries from the store. Call with the lock held."""
         try:
-            with open(self.summary_path, "w") as f:
-                f.write(summary_text)
+            self.summaries = self.store.load_summaries()
         except Exception as e:
-            print("Failed to save summary:", e)
+            print("Failed to load summaries:", e)
+        self.summary = "\n".join(entry["text"] for entry in self.summaries)
+
+    def save_summary(self, summary_text: str):
+        """Replace every summary with this one and write it immediately."""
+        with self.lock:
+            try:
+                self.store.clear_summaries()
+                self.store.add_summary({"level": 0, "text": summary_text.strip(), "created_at": time.time()})
+                self.writes += 1
+            except Exception as e:
+                print("Failed to save summary:", e)
+            self._load_summaries()
+
+    def add_summary(self, summary_text: str):
+        """Append the summary of the latest turns (level 0, the most detailed)."""
+        with self.lock:
+            try:
+                self.store.add_summary({"level": 0, "text": summary_text.strip(), "created_at": time.time()})
+                self.writes += 1
+            except Exception as e:
+                print("Failed to save summary:", e)
+            self._load_summaries()
+
+    def latest_summary(self) -> str:
+        self.sync()
+        with self.lock:
+            return self.summaries[-1]["text"] if self.summaries else ""
+
+    def condense_candidates(self, fanout: int, max_level: int):
+        """
+        The oldest `fanout` summaries of the lowest level holding more than
+        `fanout` of them (to be condensed into one), or None.
+        """
+        self.sync()
+        with self.lock:
+            for level in range(max_level + 1):
+                group = [entry for entry in self.summaries if entry["level"] == level]
+                if len(group) > fanout:
+                    return group[:fanout]
+        return None
+
+    def replace_summaries(self, group: list, summary_text: str, level: int) -> bool:
+        """Swap `group` for one condensed summary in its place; False if they're gone."""
+        condensed = {"level": level, "text": summary_text.strip(), "created_at": group[-1]["created_at"]}
+        with self.lock:
+            try:
+                replaced = self.store.replace_summaries([entry["id"] for entry in group], condensed)
+                self.writes += replaced
+            except Exception as e:
+                print("Failed to save summary:", e)
+                replaced = False
+            self._load_summaries()
+            return replaced
+
+    # ---------- TASKS ----------
+
+    # The task list ("task: ...") lives in the store, shared by every session
+    # and, with SqliteStore, every worker; it is never cached here.
+
+    def add_task(self, text: str) -> int:
+        """Append a task and write it immediately; returns the number of tasks."""
+        with self.lock:
+            self.writes += 1
+            return self.store.add_task(text, time.time())
+
+    def list_tasks(self) -> list:
+        with self.lock:
+            return [task["text"] for task in self.store.load_tasks()]
+
+    def clear_tasks(self) -> int:
+        with self.lock:
+            return self.store.clear_tasks()
 
     # ---------- CLASSIFICATION ----------
 
     def classify(self, text: str) -> str:
-        """Very simple heuristic classifier for which profile to store text in."""
-        t = text.lower()
-
-        if any(k in t for k in ("exam", "test", "gcse", "school", "teacher", "class", "homework", "revision")):
-            return "school"
-        if any(k in t for k in ("friend", "friends", "crush", "gf", "boyfriend",
-                                "girlfriend", "relationship", "mate", "bro", "pooks", "people")):
-            return "relationships"
-        if any(k in t for k in ("goal", "aim", "dream", "plan", "future", "i want to", "my target", "my goal")):
-            return "goals"
-        if any(k in t for k in ("fact", "definition", "means", "stands for", "is called", "is when")):
-            return "knowledge"
-        return "general"
+        """Which profile to store text in (see classifier.py)."""
+        return self.classifier.classify(text)
+
+    def classify_many(self, texts: list) -> list:
+        """classify() for a batch of texts, e.g. a bulk import."""
+        return self.classifier.classify_many(texts)
 
     # ---------- MUTATIONS ----------
 
-    def add_memory(self, profile: str, text: str, source: str = "user"):
+    def _stamp(self, item: dict, now: float):
+        """Fill in the bookkeeping fields a new item needs."""
+        if not self.store.assigns_ids:
+            item["id"] = self.next_id
+            self.next_id += 1
+        item.setdefault("created_at", now)
+        item.setdefault("last_used", item["created_at"])
+        item.setdefault("uses", 0)
+
+    def add_memory(self, profile: str, text: str, source: str = "user", pinned: bool = False):
+        """Store one item; pinned items (explicit `remember:`) are never evicted."""
         item = {
             "text": text,
             "source": source,
         }
-        self.memories.setdefault(profile, []).append(item)
+        if pinned:
+            item["pinned"] = True
+        with self.lock:
+            self._stamp(item, time.time())
+            # The store assigns the id first where it owns them (SQLite)
+            self.store.record_add(profile, item)
+            self.memories.setdefault(profile, []).append(item)
+            self._index_add(profile, item)
+            if self.vectors is not None:
+                self.vectors.add(id(item), text, (profile, item))
+            self.dirty.add(profile)
+            self._evict(profile)
+        return item
+
+    def add_many(self, rows) -> dict:
+        """
+        Add (profile, item) pairs in one go, e.g. a bulk import batch.
+        Stores that support it (SQLite) write the whole batch in a single
+        transaction. Returns ({profile: items added}, {profile: items
+        evicted}); retention applies to the batch like to any add.
+        """
+        added = {}
+        evicted = {}
+        now = time.time()
+        with self.lock:
+            for _, item in rows:
+                item.pop("id", None)
+                self._stamp(item, now)
+            record_many = getattr(self.store, "record_add_many", None)
+            if record_many is not None:
+                record_many(rows)
+            else:
+                for profile, item in rows:
+                    self.store.record_add(profile, item)
+            for profile, item in rows:
+                self.memories.setdefault(profile, []).append(item)
+                self._index_add(profile, item)
+                if self.vectors is not None:
+                    self.vectors.add(id(item), item.get("text", ""), (profile, item))
+                added[profile] = added.get(profile, 0) + 1
+            self.dirty.update(added)
+            for profile in added:
+                gone = self._evict(profile)
+                if gone:
+                    evicted[profile] = gone
+        return added, evicted
 
     def forget_matching(self, substring: str) -> int:
         substring = substring.lower()
         removed = 0
-        for profile in list(self.memories.keys()):
-            new_items = []
-            for item in self.memories[profile]:
-                if substring in item.get("text", "").lower():
-                    removed += 1
+        self.sync()
+        with self.lock:
+            # Stores with a text index (SQLite) say which items match, so
+            # nothing is scanned; otherwise every item's text is checked
+            find = getattr(self.store, "find_matching", None)
+            matches = find(substring) if find is not None else None
+            for profile in list(self.memories.keys()):
+                items = self.memories[profile]
+                if matches is not None:
+                    ids = matches.get(profile, ())
                 else:
-                    new_items.append(item)
-            self.memories[profile] = new_items
+                    ids = {item["id"] for item in items if substring in item.get("text", "").lower()}
+                gone = self._remove_ids(items, ids) if ids else 0
+                if gone:
+                    removed += gone
+                    self.store.record_forget(profile, substring)
+                    self.dirty.add(profile)
         return removed
 
+    def _remove_ids(self, items: list, ids) -> int:
+        """Delete items by store id in place; profiles are kept in id order, so each is a bisect."""
+        if len(ids) > 64:
+            # Mass forget: one filtering pass beats many list deletions
+            kept = [item for item in items if item.get("id") not in ids]
+            for item in items:
+                if item.get("id") in ids:
+                    self._index_remove(item)
+            removed = len(items) - len(kept)
+            items[:] = kept
+            return removed
+        removed = 0
+        for item_id in sorted(ids, reverse=True):
+            pos = bisect.bisect_left(items, item_id, key=lambda item: item.get("id", 0))
+            if pos == len(items) or items[pos].get("id") != item_id:
+                continue
+            self._index_remove(items[pos])
+            del items[pos]
+            removed += 1
+        return removed
+
+    # ---------- RETENTION ----------
+
+    def _evict(self, profile: str, now: float = None) -> int:
+        """Drop whatever `profile` holds beyond its capacity or TTL. Call with the lock held."""
+        items = self.memories.get(profile, [])
+        victims = self.retention.victims(profile, len(items), now)
+        if not victims:
+            return 0
+        removed = self._remove_ids(items, set(victims))
+        self.store.record_remove(profile, victims)
+        self.dirty.add(profile)
+        return removed
+
+    def enforce_retention(self, now: float = None) -> int:
+        """Apply every profile's capacity and TTL; cheap when nothing is due."""
+        with self.lock:
+            return sum(self._evict(profile, now) for profile in list(self.memories))
+
+    def touch(self, profile: str, items: list):
+        """Mark items as used now (they went into a prompt), for LRU / LFU / TTL."""
+        now = time.time()
+        with self.lock:
+            touched = self.touched.setdefault(profile, {})
+            for item in items:
+                self.retention.touch(profile, item, now)
+                touched[item["id"]] = item
+
     def wipe_all(self):
-        for profile in list(self.memories.keys()):
-            self.memories[profile] = []
-            path = self._path(profile)
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception:
-                    pass
-        self.summary = ""
-        if os.path.exists(self.summary_path):
-            try:
-                os.remove(self.summary_path)
-            except Exception:
-                pass
+        # Wait for a flush in progress, which could otherwise write a wiped profile back
+        with self.save_lock, self.lock:
+            for profile in list(self.memories.keys()):
+                self.memories[profile] = []
+                self.store.record_wipe(profile)
+            self.index.clear()
+            if self.vectors is not None:
+                self.vectors.clear()
+            self.retention.clear()
+            self.touched.clear()
+            self.summaries = []
+            self.summary = ""
+            self.store.clear_summaries()
+            self.store.clear_tasks()
+            self.dirty.clear()
 
     # ---------- PRESENTATION ----------
 
     def list_memories(self) -> str:
+        self.sync()
         lines = []
         for profile in PROFILES:
             lines.append(f"[{profile}]")
@@ -127,6 +506,8 @@ class MemoryManager:
             else:
                 for item in items[:5]:
                     lines.append(f"- {item['text']}")
+                if len(items) > 5:
+                    lines.append(f"- ... and {len(items) - 5} more (python -m memory_io export)")
             lines.append("")  # blank line between profiles
 
         if self.summary:
@@ -135,18 +516,45 @@ class MemoryManager:
 
         return "\n".join(lines)
 
-    def build_memory_context(self, active_profile: str) -> str:
+    def build_memory_context(self, active_profile: str, query: str = None,
+                             top_k: int = 8, token_budget: int = 400) -> str:
         """
         Build a neutral text block summarising relevant memory for injection into the system prompt.
+        With a query (the current user message), the items from any profile that
+        best match it are added too, most relevant first, until token_budget is spent.
         """
+        self.sync()
+        # Expire anything past its TTL before it can be quoted
+        self.enforce_retention()
         parts = []
+        budget = token_budget
 
         # Recent items in the active profile
         active_items = self.memories.get(active_profile, [])
-        if active_items:
+        recent = active_items[-5:]
+        if recent:
             parts.append(f"Active profile: {active_profile}. Key items:")
-            for item in active_items[-5:]:
+            for item in recent:
                 parts.append(f"- {item['text']}")
+                budget -= count_tokens(item["text"])
+            self.touch(active_profile, recent)
+
+        # Older / other-profile items relevant to what the user just said
+        if query:
+            seen = {id(item) for item in recent}
+            relevant = []
+            for profile, item in self.search(query, top_k):
+                if id(item) in seen:
+                    continue
+                cost = count_tokens(item["text"])
+                if cost > budget:
+                    break
+                budget -= cost
+                relevant.append(f"- [{profile}] {item['text']}")
+                self.touch(profile, [item])
+            if relevant:
+                parts.append("Relevant stored items:")
+                parts.extend(relevant)
 
         # Mention other profiles that have data
         other_profiles = [
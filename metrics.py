@@ -0,0 +1,214 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds: sub-millisecond local stages up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """Base for a metric family: one value (or bucket set) per label combination."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def replace(self, values: dict):
+        """Swap in a full {label tuple: value} snapshot (for values read at scrape time)."""
+        with self.lock:
+            self.values = dict(values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. observe() is one bisect and two additions
+    under a lock; cumulative bucket counts are only built at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        names = self.labels + ("le",)
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (le,))} {running}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class Registry:
+    """
+    Holds the metric families and renders them in the Prometheus text format.
+    Collectors run at scrape time to refresh gauges that are cheaper to read
+    on demand (cache stats, memory sizes) than to track on every change.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def on_collect(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception as e:
+                print("Metrics collector failed:", e)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- HOT-PATH METRICS ----------
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "copilot_stage_seconds", "Time spent in each stage of a turn.", ["stage"]))
+TOKENS = REGISTRY.register(Counter(
+    "copilot_tokens_total", "Estimated model tokens by direction (input/output).", ["direction"]))
+TURNS = REGISTRY.register(Counter(
+    "copilot_turns_total", "Turns by how they were answered (command/cache/model).", ["outcome"]))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "copilot_http_request_seconds", "HTTP request latency by route.", ["method", "route", "status"]))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "copilot_http_in_flight", "HTTP requests currently being served, by route.", ["route"]))
+
+
+def stage(name: str):
+    """`with stage("model"): ...` records the block's duration under that stage."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware recording per-route latency (until the last body
+    chunk, so streamed replies count in full) and in-flight requests.
+    `routes` is a callable returning the app's routes; unknown paths are
+    grouped as "other" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+        self.paths = None
+
+    def _route(self, path: str) -> str:
+        if self.paths is None:
+            self.paths = {getattr(r, "path", None) for r in self.routes()}
+        return path if path in self.paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route(scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"],
+                                 route=route, status=status)
@@ -0,0 +1,283 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+from google.api_core import exceptions as api_exceptions
+
+from context import count_tokens
+
+# Transient upstream failures worth retrying (429 / 500 / 503 / 504)
+RETRYABLE = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+)
+
+# Rough input-token cost of one inline image
+IMAGE_TOKENS = 258
+
+
+class ModelUnavailable(Exception):
+    """The upstream model is failing (circuit open or retries exhausted)."""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_input_tokens(contents) -> int:
+    tokens = 0
+    for msg in contents or []:
+        for part in msg.get("parts", []) if isinstance(msg, dict) else [msg]:
+            tokens += count_tokens(part) if isinstance(part, str) else IMAGE_TOKENS
+    return tokens
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+    Shared between the event loop and worker threads.
+    """
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Take `amount` now (possibly going negative) and return how long to wait for it."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request bigger than the whole bucket just waits for a full bucket
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, amount: float = 1):
+        wait = self._reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1):
+        wait = self._reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and fails fast for
+    `cooldown` seconds, then lets one trial call through (half-open):
+    success closes it again, failure re-opens it, and anything else
+    (a bad request, a cancelled call) just frees the slot for the next trial.
+    """
+
+    def __init__(self, threshold: int = 10, cooldown: float = 30, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return
+            retry_after = max(0.0, self.cooldown - (self.clock() - self.opened_at))
+            raise ModelUnavailable("Model temporarily unavailable (circuit open).", retry_after)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_neutral(self):
+        """The call ended without telling us whether the upstream is healthy."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+class ModelGateway:
+    """
+    Shared policy for every outbound model call:
+    - token buckets for requests/minute and input tokens/minute
+    - jittered exponential retry of transient errors
+    - circuit breaker that fails fast while the upstream is down
+    - optional hedging: if a (non-streaming, async) call hasn't answered
+      after `hedge_after` seconds, a second identical call races it
+    Wrap models with gateway.wrap(model); the result is a drop-in model.
+    """
+
+    def __init__(self, rpm: float = None, tpm: float = None, max_retries: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 16, breaker: CircuitBreaker = None,
+                 hedge_after: float = None, rng: random.Random = None):
+        rpm = rpm or float(os.getenv("COPILOT_MODEL_RPM", "150"))
+        tpm = tpm or float(os.getenv("COPILOT_MODEL_TPM", "2000000"))
+        if hedge_after is None:
+            hedge_after = float(os.getenv("COPILOT_HEDGE_AFTER", "0"))
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_after = hedge_after
+        self.rng = rng or random.Random()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    def wrap(self, model):
+        return GuardedModel(model, self)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, base * 2^attempt], capped
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _check_breaker(self):
+        try:
+            self.breaker.before_call()
+        except ModelUnavailable:
+            self.stats["rejected"] += 1
+            raise
+
+    def _give_up(self, error):
+        self.stats["failures"] += 1
+        raise ModelUnavailable(f"Model call failed after retries: {error}") from error
+
+    # ---------- SYNC ----------
+
+    def call(self, fn, contents):
+        cost = estimate_input_tokens(contents)
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                # Retries count against the quota like any other call
+                self.requests.acquire(1)
+                self.tokens.acquire(cost)
+                self.stats["calls"] += 1
+                result = fn()
+            except RETRYABLE as e:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    self._give_up(e)
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                self.breaker.record_neutral()
+                raise
+            self.breaker.record_success()
+            return result
+
+    # ---------- ASYNC ----------
+
+    async def call_async(self, fn, contents, hedge: bool = True):
+        cost = estimate_input_tokens(contents)
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                await self.requests.acquire_async(1)
+                await self.tokens.acquire_async(cost)
+                if hedge and self.hedge_after > 0:
+                    result = await self._hedged(fn, cost)
+                else:
+                    self.stats["calls"] += 1
+                    result = await fn()
+            except RETRYABLE as e:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    self._give_up(e)
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                # Bad request or the client went away: no verdict on the upstream
+                self.breaker.record_neutral()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, fn, cost: int):
+        self.stats["calls"] += 1
+        primary = asyncio.ensure_future(fn())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+
+            # Slow call: race a second copy of it, only if there is quota to spare
+            if self.requests.tokens < 1 or self.tokens.tokens < cost:
+                return await primary
+            await self.requests.acquire_async(1)
+            await self.tokens.acquire_async(cost)
+            self.stats["hedged"] += 1
+            self.stats["calls"] += 1
+            backup = asyncio.ensure_future(fn())
+            pending.add(backup)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser (or both, if the caller went away) is cancelled
+            for task in pending:
+                task.cancel()
+
+
+class GuardedModel:
+    """A model whose generate_content calls go through a ModelGateway."""
+
+    def __init__(self, model, gateway: ModelGateway):
+        self.model = model
+        self.gateway = gateway
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def generate_content(self, contents=None, **kwargs):
+        return self.gateway.call(lambda: self.model.generate_content(contents=contents, **kwargs), contents)
+
+    async def generate_content_async(self, contents=None, stream: bool = False, **kwargs):
+        # Streams are not hedged: only the first chunk could be raced, not the whole reply
+        return await self.gateway.call_async(
+            lambda: self.model.generate_content_async(contents=contents, stream=stream, **kwargs),
+            contents,
+            hedge=not stream,
+        )
@@ -0,0 +1,170 @@
+import time
+import asyncio
+import hashlib
+import datetime
+from collections import OrderedDict
+
+import google.generativeai as genai
+
+
+class GeminiCacheBackend:
+    """Server-side context caching through google.generativeai.caching."""
+
+    def find(self, display_name: str):
+        for cached in genai.caching.CachedContent.list():
+            if cached.display_name == display_name:
+                return cached
+        return None
+
+    def create(self, model_name: str, system_instruction: str, display_name: str, ttl: float):
+        return genai.caching.CachedContent.create(
+            model=model_name,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+
+    def refresh(self, handle, ttl: float):
+        handle.update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, handle):
+        handle.delete()
+
+    def model(self, handle):
+        return genai.GenerativeModel.from_cached_content(handle)
+
+    def plain(self, model_name: str, system_instruction: str):
+        return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+# Swapped out by fake_model.install() for offline runs
+default_backend = GeminiCacheBackend
+
+
+class PromptCache:
+    """
+    Registers each static system prompt once as cached content and hands
+    out a model bound to it, so per-turn requests only carry memory + history.
+    - keyed by a hash of the prompt text: editing AGENT_INSTRUCTION gives a
+      new key, so the cache is recreated automatically (and reused across
+      restarts/workers, which look it up by display name)
+    - TTL is extended once a cache is within `refresh_margin` of expiring
+    - if caching is unavailable (API error, prompt below the minimum cacheable
+      size) the prompt is still sent as a proper system_instruction
+    - `wrap` (e.g. ModelGateway.wrap) is applied to every model handed out
+    - amodel_for keeps the backend calls off the event loop
+    """
+
+    def __init__(self, model_name: str = "models/gemini-2.5-pro", ttl: float = 3600,
+                 refresh_margin: float = 300, max_entries: int = 8, backend=None,
+                 clock=time.time, wrap=None):
+        self.model_name = model_name
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self.backend = backend or default_backend()
+        self.clock = clock
+        self.wrap = wrap or (lambda model: model)
+        # key -> {"handle", "model", "expires_at"}; least recently used first
+        self.entries = OrderedDict()
+        # key -> the task renewing its entry (amodel_for)
+        self.pending = {}
+        self.stats = {"created": 0, "reused": 0, "refreshed": 0, "fallbacks": 0, "deleted": 0}
+
+    def key(self, system_instruction: str) -> str:
+        digest = hashlib.sha256(f"{self.model_name}\n{system_instruction}".encode()).hexdigest()
+        return digest[:16]
+
+    def _fresh(self, key: str, now: float):
+        """The entry for `key` if it can be used without a backend call, else None."""
+        entry = self.entries.get(key)
+        if entry is None or now >= entry["expires_at"] - self.refresh_margin:
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _renew(self, key: str, system_instruction: str, entry, now: float) -> dict:
+        """Extend `entry`'s TTL or open a new entry: the blocking backend calls."""
+        if entry is not None and entry["handle"] is not None:
+            try:
+                self.backend.refresh(entry["handle"], self.ttl)
+                self.stats["refreshed"] += 1
+                return {**entry, "expires_at": now + self.ttl}
+            except Exception as e:
+                # Most likely already expired upstream: build a new one
+                print("Failed to refresh prompt cache, recreating:", e)
+        # New, expired upstream, or an uncached fallback trying caching again
+        return self._open(key, system_instruction, now)
+
+    def _install(self, key: str, entry: dict) -> list:
+        """Make `entry` current for `key`; returns the entries evicted for it."""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False)[1])
+        return evicted
+
+    def model_for(self, system_instruction: str):
+        """A model with `system_instruction` applied, served from cached content when possible."""
+        key = self.key(system_instruction)
+        now = self.clock()
+        entry = self._fresh(key, now)
+        if entry is None:
+            entry = self._renew(key, system_instruction, self.entries.get(key), now)
+            for old in self._install(key, entry):
+                self._delete(old)
+        return entry["model"]
+
+    async def amodel_for(self, system_instruction: str):
+        """
+        model_for() for the event loop. Creating, finding or refreshing the
+        cached content are blocking API calls, so they run in a thread, once
+        per prompt however many requests are waiting for it.
+        """
+        key = self.key(system_instruction)
+        now = self.clock()
+        entry = self._fresh(key, now)
+        if entry is not None:
+            return entry["model"]
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self._arenew(key, system_instruction, now))
+        # A cancelled request must not cancel the renewal others are waiting for
+        return (await asyncio.shield(task))["model"]
+
+    async def _arenew(self, key: str, system_instruction: str, now: float) -> dict:
+        try:
+            entry = await asyncio.to_thread(self._renew, key, system_instruction, self.entries.get(key), now)
+            for old in self._install(key, entry):
+                await asyncio.to_thread(self._delete, old)
+            return entry
+        finally:
+            self.pending.pop(key, None)
+
+    def _open(self, key: str, system_instruction: str, now: float) -> dict:
+        display_name = f"copilot-{key}"
+        try:
+            handle = self.backend.find(display_name)
+            if handle is not None:
+                self.stats["reused"] += 1
+                self.backend.refresh(handle, self.ttl)
+            else:
+                handle = self.backend.create(self.model_name, system_instruction, display_name, self.ttl)
+                self.stats["created"] += 1
+            model = self.wrap(self.backend.model(handle))
+            return {"handle": handle, "model": model, "expires_at": now + self.ttl}
+        except Exception as e:
+            print("Prompt caching unavailable, sending system instruction uncached:", e)
+            self.stats["fallbacks"] += 1
+            model = self.wrap(self.backend.plain(self.model_name, system_instruction))
+            return {"handle": None, "model": model, "expires_at": now + self.ttl}
+
+    def _delete(self, entry: dict):
+        if entry["handle"] is None:
+            return
+        try:
+            self.backend.delete(entry["handle"])
+            self.stats["deleted"] += 1
+        except Exception as e:
+            print("Failed to delete prompt cache:", e)
@@ -0,0 +1,85 @@
+import re
+import hashlib
+
+from commands import PERSONAS
+from context import count_tokens
+from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
+
+# "=====\n   TITLE\n=====" section banners and "-----\n1) NAME MODE ...\n-----" persona headers
+BANNER_RE = re.compile(r"^=+\n[ \t]*(.+?)[ \t]*\n=+\n", re.MULTILINE)
+PROFILE_RE = re.compile(r"^-+\n\d+\) (\w+) MODE.*\n-+\n", re.MULTILINE)
+
+PROFILES_SECTION = "PERSONA PROFILES"
+# Personas defined in terms of others: their profiles go along too
+RELATED = {"Hybrid": ("Ayanokoji", "User")}
+PROFILES_NOTE = (
+    "Only the active persona's profile is included below; the platform handles\n"
+    "persona switching and tells you the active persona in [SESSION STATE].\n\n"
+)
+
+
+def split(text: str, pattern) -> tuple:
+    """(text before the first header, [(header, name, body), ...])."""
+    matches = list(pattern.finditer(text))
+    if not matches:
+        return text, []
+    parts = []
+    for m, end in zip(matches, [m.start() for m in matches[1:]] + [len(text)]):
+        parts.append((m.group(0), m.group(1), text[m.end():end]))
+    return text[:matches[0].start()], parts
+
+
+class PromptCompiler:
+    """
+    Parses the persona engine into sections once, then builds each
+    persona's system prompt from the shared sections plus only that
+    persona's profile (and those it builds on, see RELATED), instead of
+    all five. Compiled prompts are memoized per persona; a compiler
+    belongs to one version of the source text, so editing the prompts
+    means building a new one (and a new prompt cache entry).
+    """
+
+    def __init__(self, agent_instruction: str = AGENT_INSTRUCTION,
+                 session_instruction: str = SESSION_INSTRUCTION):
+        self.full = agent_instruction + "\n\n" + session_instruction
+        self.version = hashlib.sha256(self.full.encode()).hexdigest()[:12]
+        self.session_instruction = session_instruction
+        self.head, self.sections = split(agent_instruction, BANNER_RE)
+        self.profiles = {}  # persona -> its profile text
+        for i, (banner, title, body) in enumerate(self.sections):
+            if title == PROFILES_SECTION:
+                intro, profiles = split(body, PROFILE_RE)
+                self.profiles = {name.title(): header + text for header, name, text in profiles}
+                self.profiles_at, self.profiles_intro = i, intro
+        self.compiled = {}
+
+    def compile(self, persona: str) -> str:
+        """The system prompt for `persona` (the full one if it has no profile)."""
+        prompt = self.compiled.get(persona)
+        if prompt is None:
+            if persona not in self.profiles:
+                prompt = self.full
+            else:
+                keep = (persona,) + RELATED.get(persona, ())
+                parts = [self.head]
+                for i, (banner, title, body) in enumerate(self.sections):
+                    if i == self.profiles_at:
+                        body = self.profiles_intro + PROFILES_NOTE + "".join(
+                            text for name, text in self.profiles.items() if name in keep)
+                    parts.append(banner + body)
+                prompt = "".join(parts) + "\n\n" + self.session_instruction
+            self.compiled[persona] = prompt
+        return prompt
+
+    def report(self) -> dict:
+        """Tokens of each persona's prompt against the full one."""
+        full = count_tokens(self.full)
+        rows = {}
+        for persona in PERSONAS:
+            tokens = count_tokens(self.compile(persona))
+            rows[persona] = {"tokens": tokens, "saved": full - tokens,
+                             "saved_pct": round(100 * (full - tokens) / full, 1)}
+        return {"version": self.version, "full_tokens": full, "personas": rows}
+
+
+COMPILER = PromptCompiler()
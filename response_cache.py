@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from storage import MEMORY_DIR, atomic_write
+
+CACHE_DIR = os.path.join(MEMORY_DIR, "response_cache")
+
+
+def content_key(*parts) -> str:
+    """sha256 over a mix of bytes / str / JSON-able parts (e.g. image bytes + prompt)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode()
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode()
+        # Length prefix so ("ab", "c") and ("a", "bc") differ
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model replies.
+    - memory tier: LRU of up to `max_items` replies
+    - disk tier: one small JSON file per reply under memory/response_cache/,
+      oldest evicted once the directory passes `max_disk_bytes`
+    A disk hit is promoted back into memory.
+    """
+
+    def __init__(self, max_items: int = 512, max_disk_bytes: int = 50 * 1024 * 1024,
+                 cache_dir: str = CACHE_DIR):
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+
+        self.memory = OrderedDict()  # key -> reply
+        self.disk = OrderedDict()  # key -> file size, oldest use first
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(cache_dir, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+        self.disk_bytes = sum(self.disk.values())
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        with self.lock:
+            reply = self.memory.get(key)
+            if reply is not None:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return reply
+
+            if key in self.disk:
+                try:
+                    with open(self._path(key), "r") as f:
+                        reply = json.load(f)["reply"]
+                except Exception:
+                    self.disk_bytes -= self.disk.pop(key)
+                else:
+                    self.disk.move_to_end(key)
+                    os.utime(self._path(key))
+                    self.stats["disk_hits"] += 1
+                    self._remember(key, reply)
+                    return reply
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, reply: str):
+        with self.lock:
+            self._remember(key, reply)
+            if key in self.disk:
+                return
+            data = json.dumps({"reply": reply})
+            try:
+                atomic_write(self._path(key), data)
+            except Exception as e:
+                print("Failed to write response cache entry:", e)
+                return
+            self.disk[key] = len(data)
+            self.disk_bytes += len(data)
+            while self.disk_bytes > self.max_disk_bytes and self.disk:
+                old_key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                self.stats["evictions"] += 1
+                try:
+                    os.remove(self._path(old_key))
+                except Exception:
+                    pass
+
+    def _remember(self, key: str, reply: str):
+        self.memory[key] = reply
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def report(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self.memory),
+            "disk_items": len(self.disk),
+            "disk_bytes": self.disk_bytes,
+        }
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import heapq
+
+# Which unpinned item goes first when a profile is over capacity
+POLICIES = {
+    "lru": lambda item: (last_used(item),),
+    "lfu": lambda item: (item.get("uses", 0), last_used(item)),
+    "fifo": lambda item: (item.get("created_at") or 0,),
+}
+
+
+def last_used(item: dict) -> float:
+    return item.get("last_used") or item.get("created_at") or 0
+
+
+class Policy:
+    """
+    Retention for one profile:
+    - capacity: most items kept (0 = unbounded); over it, unpinned items are
+      evicted in `order` (lru, lfu or fifo)
+    - ttl_days: unpinned items not used for this long expire (0 = never)
+    """
+
+    def __init__(self, capacity: int = 10000, order: str = "lru", ttl_days: float = 0):
+        if order not in POLICIES:
+            raise ValueError(f"Unknown retention policy '{order}'. Available: {', '.join(POLICIES)}.")
+        self.capacity = capacity
+        self.order = order
+        self.ttl = ttl_days * 86400
+
+    @classmethod
+    def from_env(cls, overrides: dict = None):
+        """$COPILOT_MEMORY_CAPACITY / _POLICY / _TTL_DAYS, with `overrides` on top."""
+        options = {
+            "capacity": int(os.getenv("COPILOT_MEMORY_CAPACITY", "10000")),
+            "order": os.getenv("COPILOT_MEMORY_POLICY", "lru"),
+            "ttl_days": float(os.getenv("COPILOT_MEMORY_TTL_DAYS", "0")),
+        }
+        options.update(overrides or {})
+        return cls(**options)
+
+
+def load_policies(profiles) -> dict:
+    """
+    {profile: Policy}. Per-profile overrides come from $COPILOT_MEMORY_RETENTION,
+    e.g. {"general": {"capacity": 2000, "order": "lfu", "ttl_days": 90}}.
+    """
+    overrides = {}
+    raw = os.getenv("COPILOT_MEMORY_RETENTION")
+    if raw:
+        try:
+            overrides = json.loads(raw)
+        except ValueError as e:
+            print("Ignoring malformed COPILOT_MEMORY_RETENTION:", e)
+    return {profile: Policy.from_env(overrides.get(profile)) for profile in profiles}
+
+
+class LazyHeap:
+    """
+    Min-heap of (key(item), id). Entries are never updated in place: a
+    re-keyed item is pushed again and stale entries (removed items, or an
+    old key) are dropped when they reach the top. Amortised O(log n).
+    """
+
+    def __init__(self, key, live: dict):
+        self.key = key
+        self.live = live  # id -> item for every item still tracked
+        self.heap = []
+        self.stale = 0  # entries known to be superseded
+
+    def push(self, item: dict, replaces: bool = False):
+        heapq.heappush(self.heap, (self.key(item), item["id"]))
+        if replaces:
+            self.stale += 1
+            if self.stale > len(self.heap) // 2 + 1024:
+                self.stale = 0
+                self.heap = [entry for entry in self.heap if self._valid(entry)]
+                heapq.heapify(self.heap)
+
+    def _valid(self, entry) -> bool:
+        item = self.live.get(entry[1])
+        return item is not None and self.key(item) == entry[0]
+
+    def peek(self):
+        """The live item with the smallest key, or None."""
+        while self.heap:
+            if self._valid(self.heap[0]):
+                return self.live[self.heap[0][1]]
+            heapq.heappop(self.heap)
+        return None
+
+
+class Retention:
+    """
+    Eviction bookkeeping for every profile. MemoryManager tells it about
+    each item added, used (touch) or removed; it answers which unpinned
+    items to evict for capacity or expiry without scanning the profile.
+    """
+
+    def __init__(self, policies: dict, clock=time.time):
+        self.policies = policies
+        self.clock = clock
+        self.live = {}  # id -> unpinned item, across profiles (ids are unique)
+        self.by_order = {}  # profile -> LazyHeap in the policy's eviction order
+        self.by_idle = {}  # profile -> LazyHeap by last use, when that differs (TTL with lfu / fifo)
+
+    def _heaps(self, profile: str):
+        if profile not in self.by_order:
+            policy = self.policies.get(profile) or Policy.from_env()
+            self.policies[profile] = policy
+            self.by_order[profile] = LazyHeap(POLICIES[policy.order], self.live)
+            if policy.ttl and policy.order != "lru":
+                self.by_idle[profile] = LazyHeap(POLICIES["lru"], self.live)
+        return self.by_order[profile], self.by_idle.get(profile)
+
+    def track(self, profile: str, item: dict):
+        if item.get("pinned") or item.get("id") is None:
+            return
+        order, idle = self._heaps(profile)
+        self.live[item["id"]] = item
+        order.push(item)
+        if idle is not None:
+            idle.push(item)
+
+    def untrack(self, item: dict):
+        self.live.pop(item.get("id"), None)
+
+    def touch(self, profile: str, item: dict, now: float = None):
+        """Record a use: bump last_used / uses and re-key the item."""
+        item["last_used"] = now or self.clock()
+        item["uses"] = item.get("uses", 0) + 1
+        if item.get("id") in self.live:
+            order, idle = self._heaps(profile)
+            order.push(item, replaces=True)
+            if idle is not None:
+                idle.push(item, replaces=True)
+
+    def clear(self):
+        self.live.clear()
+        self.by_order.clear()
+        self.by_idle.clear()
+
+    def victims(self, profile: str, size: int, now: float = None) -> list:
+        """
+        Ids to evict from `profile`, which currently holds `size` items:
+        everything expired, then the first in eviction order until it fits.
+        """
+        order, idle = self._heaps(profile)
+        policy = self.policies[profile]
+        victims = []
+
+        if policy.ttl:
+            deadline = (now or self.clock()) - policy.ttl
+            heap = idle or order
+            while (item := heap.peek()) is not None and last_used(item) < deadline:
+                victims.append(self.live.pop(item["id"])["id"])
+        if policy.capacity:
+            while size - len(victims) > policy.capacity and (item := order.peek()) is not None:
+                victims.append(self.live.pop(item["id"])["id"])
+        return victims
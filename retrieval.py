@@ -0,0 +1,130 @@
+import re
+import math
+import heapq
+import itertools
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Words too common to say anything about relevance
+STOPWORDS = frozenset("""
+a an and are as at be but by do for from has have i i'm if in is it its me my
+of on or so that the their them they this to was we were what when with you your
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25.
+    Documents are added and removed one at a time, so the index stays in
+    step with MemoryManager without ever being rebuilt. A query only walks
+    the posting lists of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, expand_limit: int = 128):
+        self.k1 = k1
+        self.b = b
+        self.expand_limit = expand_limit
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_terms = {}  # doc_id -> Counter of terms
+        self.doc_len = {}  # doc_id -> number of terms
+        self.payloads = {}  # doc_id -> whatever the caller wants back
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id, text: str, payload=None):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.doc_len[doc_id] = sum(terms.values())
+        self.payloads[doc_id] = payload
+        self.total_len += self.doc_len[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.payloads.pop(doc_id, None)
+        self.total_len -= self.doc_len.pop(doc_id)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_len.clear()
+        self.payloads.clear()
+        self.total_len = 0
+
+    def search(self, query: str, k: int = 10) -> list:
+        """
+        Return up to k (score, doc_id, payload) tuples, best first.
+
+        Only terms with short posting lists (<= expand_limit documents) are
+        walked to find candidates; very common terms just add their score to
+        those candidates, which keeps a query cheap however big the index gets.
+        If every query term is common, the newest expand_limit documents of
+        the rarest one are used as candidates.
+        """
+        n = len(self.doc_terms)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+
+        terms = []
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting:
+                df = len(posting)
+                terms.append((df, term, posting, math.log(1 + (n - df + 0.5) / (df + 0.5))))
+        if not terms:
+            return []
+        terms.sort()
+
+        # Per-document length normalisation, computed once per candidate
+        norm_a = k1 * (1 - b)
+        norm_b = k1 * b / avg_len
+        scores = {}
+        norms = {}
+        common = []
+        for df, term, posting, idf in terms:
+            if df > self.expand_limit:
+                common.append((term, idf))
+                continue
+            for doc_id, tf in posting.items():
+                norm = norms.get(doc_id)
+                if norm is None:
+                    norm = norms[doc_id] = norm_a + norm_b * doc_len[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        if not scores:
+            df, term, posting, idf = terms[0]
+            common = common[1:]
+            for doc_id in itertools.islice(reversed(posting), self.expand_limit):
+                tf = posting[doc_id]
+                norm = norms[doc_id] = norm_a + norm_b * doc_len[doc_id]
+                scores[doc_id] = idf * tf * (k1 + 1) / (tf + norm)
+
+        doc_terms = self.doc_terms
+        for term, idf in common:
+            for doc_id in scores:
+                tf = doc_terms[doc_id].get(term)
+                if tf:
+                    scores[doc_id] += idf * tf * (k1 + 1) / (tf + norms[doc_id])
+
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(score, doc_id, self.payloads[doc_id]) for doc_id, score in best]
@@ -1,12 +1,26 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 import google.generativeai as genai
 import os
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from agent import Copilot
-from PIL import Image
+from memory_manager import MemoryManager
+from sessions import SessionRegistry
+from summariser import SummaryWorker
+from prompt_cache import PromptCache
+from prompt_compiler import COMPILER
+from model_client import ModelGateway, ModelUnavailable
+from metrics import REGISTRY, Counter, Gauge, MetricsMiddleware, stage
+from response_cache import ResponseCache, content_key
+from memory_io import LineTooLong, batched, export_jsonl, import_stream
+from image_pipeline import (
+    FORM_OVERHEAD, MAX_UPLOAD_BYTES, BadImage, UploadTooLarge, preprocess_async, read_upload,
+)
 import io
+import json
+import time
 import base64
 
 # Load environment variables from .env file
@@ -24,40 +38,257 @@ app.add_middleware(
     allow_origins=["*"],  # Allow all origins (you can restrict this later)
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Session-Id"],  # Let the browser read its session id
+)
+
+# Per-route latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware, routes=lambda: app.routes)
+
+# Long-term memory, the model client, the summariser and the cached persona
+# prompt are shared; conversation state is per session.
+# Every model call (chat, vision, summaries) goes through one gateway so
+# the rate limits, retries and circuit breaker see all traffic.
+# With `uvicorn --workers N` set COPILOT_MEMORY_STORE=sqlite: workers then
+# share one database and pick up each other's changes (the JSON stores
+# refuse to open a directory another process is using).
+memory = MemoryManager()
+gateway = ModelGateway()
+chat_model = gateway.wrap(genai.GenerativeModel("models/gemini-2.5-pro"))
+summariser = SummaryWorker(chat_model)
+prompt_cache = PromptCache(ttl=float(os.getenv("COPILOT_PROMPT_CACHE_TTL", "3600")),
+                           wrap=gateway.wrap)
+response_cache = ResponseCache(
+    max_items=int(os.getenv("COPILOT_RESPONSE_CACHE_ITEMS", "512")),
+    max_disk_bytes=int(os.getenv("COPILOT_RESPONSE_CACHE_BYTES", str(50 * 1024 * 1024))),
+)
+
+sessions = SessionRegistry(
+    lambda: Copilot(model=chat_model, memory=memory, summariser=summariser,
+                    prompt_cache=prompt_cache, response_cache=response_cache),
+    max_sessions=int(os.getenv("COPILOT_MAX_SESSIONS", "256")),
+    ttl_seconds=float(os.getenv("COPILOT_SESSION_TTL", "1800")),
 )
 
-# Create an instance of your custom Copilot class
-bot = Copilot()
+SESSION_COOKIE = "copilot_session"
+
+# ---------- METRICS ----------
+
+# Read from the shared objects at scrape time rather than tracked per change
+MEMORY_ITEMS = REGISTRY.register(Gauge(
+    "copilot_memory_items", "Long-term memory items per profile.", ["profile"]))
+SESSIONS_LIVE = REGISTRY.register(Gauge(
+    "copilot_sessions_live", "Sessions currently held in memory."))
+RESPONSE_CACHE = REGISTRY.register(Counter(
+    "copilot_response_cache_total", "Response cache lookups and evictions.", ["result"]))
+RESPONSE_CACHE_HIT_RATE = REGISTRY.register(Gauge(
+    "copilot_response_cache_hit_rate", "Response cache hit rate since start."))
+PROMPT_CACHE = REGISTRY.register(Counter(
+    "copilot_prompt_cache_total", "Persona prompt cache operations.", ["event"]))
+MODEL_CALLS = REGISTRY.register(Counter(
+    "copilot_model_gateway_total", "Model gateway calls, retries, failures and hedges.", ["event"]))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "copilot_model_circuit_open", "1 while the model circuit breaker is open or half-open."))
+SUMMARIES = REGISTRY.register(Counter(
+    "copilot_summaries_total", "Background summaries by outcome.", ["outcome"]))
+
+
+@REGISTRY.on_collect
+def collect_state():
+    with memory.lock:
+        MEMORY_ITEMS.replace({(p,): len(items) for p, items in memory.memories.items()})
+    SESSIONS_LIVE.set(len(sessions.sessions))
+    report = response_cache.report()
+    RESPONSE_CACHE.replace({(k,): report[k] for k in ("memory_hits", "disk_hits", "misses", "evictions")})
+    RESPONSE_CACHE_HIT_RATE.set(report["hit_rate"])
+    PROMPT_CACHE.replace({(k,): v for k, v in prompt_cache.stats.items()})
+    MODEL_CALLS.replace({(k,): v for k, v in gateway.stats.items()})
+    CIRCUIT_OPEN.set(0 if gateway.breaker.state == "closed" else 1)
+    SUMMARIES.replace({("completed",): summariser.completed, ("coalesced",): summariser.coalesced,
+                      ("condensed",): summariser.condensed})
+
+
+def resolve_session(request: Request):
+    """
+    Resolve the caller's session id from the X-Session-Id header (or cookie),
+    minting a new one if missing or malformed.
+    """
+    session_id = request.headers.get("x-session-id") or request.cookies.get(SESSION_COOKIE)
+    if not SessionRegistry.valid_id(session_id):
+        session_id = SessionRegistry.new_id()
+    return session_id, sessions.get(session_id)
+
+
+def attach_session(response: Response, session_id: str):
+    """Echo the session id back so the client can reuse it."""
+    response.headers["X-Session-Id"] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+
+def sse(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@app.exception_handler(ModelUnavailable)
+async def model_unavailable(request: Request, exc: ModelUnavailable):
+    """Upstream model down or rate limited beyond our retries: 503, not 500."""
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))}
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+
+@app.on_event("shutdown")
+def shutdown():
+    sessions.close()
+    summariser.close()
+    memory.close()
 
 # Pydantic model for chat requests
 class ChatRequest(BaseModel):
     text: str
 
+class BatchRequest(BaseModel):
+    prompts: list[str]
+    concurrency: int = 8
+
+BATCH_MAX_PROMPTS = int(os.getenv("COPILOT_BATCH_MAX_PROMPTS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("COPILOT_BATCH_MAX_CONCURRENCY", "16"))
+
 # Chat endpoint
 @app.post("/chat")
-async def chat(request: ChatRequest):
-    response = bot.run(request.text)
-    return {"reply": response}
+async def chat(request: ChatRequest, http_request: Request, http_response: Response):
+    session_id, bot = resolve_session(http_request)
+    attach_session(http_response, session_id)
+    response = await bot.arun(request.text)
+    return {"reply": response, "context_tokens": bot.last_context}
 
-@app.post("/vision")
-async def vision(file: UploadFile = File(...)):
-    # Read the uploaded image file
-    image_data = await file.read()
-
-    # Create a Gemini model instance
-    model = genai.GenerativeModel("models/gemini-2.5-pro")
-
-    # Pass the image directly in a single coherent request
-    response = model.generate_content(
-        contents=[
-            {
-                "role": "user",
-                "parts": [
-                    "Explain this image in detail:",
-                    {"mime_type": file.content_type, "data": image_data}
-                ],
-            }
-        ]
+# Streaming chat endpoint: relays model chunks as Server-Sent Events
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    session_id, bot = resolve_session(http_request)
+
+    async def events():
+        try:
+            async for chunk in bot.astream(request.text):
+                yield sse({"text": chunk})
+        except Exception as e:
+            yield sse({"error": str(e)}, event="error")
+            return
+        yield sse({}, event="done")
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+    attach_session(response, session_id)
+    return response
+
+# Batch endpoint: independent prompts fanned out with bounded concurrency
+@app.post("/chat/batch")
+async def chat_batch(request: BatchRequest, http_request: Request, http_response: Response):
+    if len(request.prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_PROMPTS} prompts per batch.")
+    session_id, bot = resolve_session(http_request)
+    attach_session(http_response, session_id)
+
+    concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY))
+    start = time.perf_counter()
+    results = await bot.arun_batch(request.prompts, concurrency)
+    return {
+        "results": results,
+        "concurrency": concurrency,
+        "errors": sum(1 for r in results if r["error"]),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+@app.get("/sessions")
+async def list_sessions():
+    return sessions.stats()
+
+@app.get("/prompts")
+async def prompt_stats():
+    """System prompt tokens per persona against the full persona engine."""
+    return COMPILER.report()
+
+@app.get("/cache")
+async def cache_stats():
+    return response_cache.report()
+
+@app.get("/model")
+async def model_stats():
+    return {**gateway.stats, "circuit": gateway.breaker.state}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the counters and histograms above."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Bulk memory transfer as JSON Lines (see memory_io.py), streamed both ways
+@app.get("/memory/export")
+async def memory_export(profile: str = None):
+    profiles = profile.split(",") if profile else None
+    if profiles and not set(profiles) <= set(memory.PROFILES):
+        raise HTTPException(status_code=400, detail=f"Profiles: {', '.join(memory.PROFILES)}.")
+    # A few thousand lines per chunk: each chunk of a sync generator costs a threadpool hop
+    chunks = ("".join(lines) for lines in batched(export_jsonl(memory, profiles), 2000))
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+@app.post("/memory/import")
+async def memory_import(request: Request, source: str = "import"):
+    try:
+        return await import_stream(memory, request.stream(), source=source)
+    except LineTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+VISION_PROMPT = "Explain this image in detail:"
+
+@app.post("/vision")
+async def vision(request: Request):
+    """
+    Multipart upload with the image in a `file` field. The body is parsed
+    off the stream here rather than through UploadFile, which would read
+    and spool all of it before any size check could run.
+    """
+    # Reject oversized uploads before reading them when the client says how big they are
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > MAX_UPLOAD_BYTES + FORM_OVERHEAD:
+        raise HTTPException(status_code=413, detail="Image is too large.")
+
+    # Otherwise stop reading as soon as the body passes the limit
+    try:
+        image_data = await read_upload(request.stream(), request.headers.get("content-type"))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BadImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The same image + prompt has been analysed before: answer from cache
+    key = content_key("vision", VISION_PROMPT, image_data)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return {"reply": cached, "cached": True}
+
+    # Downscale, strip metadata and re-encode off the event loop
+    try:
+        with stage("vision_preprocess"):
+            payload, mime_type, image_report = await preprocess_async(image_data)
+    except BadImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Pass the image directly in a single coherent request, reusing the shared model
+    with stage("vision_model"):
+        response = await chat_model.generate_content_async(
+            contents=[
+                {
+                    "role": "user",
+                    "parts": [
+                        VISION_PROMPT,
+                        {"mime_type": mime_type, "data": payload}
+                    ],
+                }
+            ]
+        )
 
-    return {"reply": response.text}
+    response_cache.put(key, response.text)
+    return {"reply": response.text, "cached": False, "image": image_report}
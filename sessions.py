@@ -0,0 +1,275 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+from collections import OrderedDict
+
+from memory_manager import MEMORY_DIR
+
+SESSION_DIR = os.path.join(MEMORY_DIR, "sessions")
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# A session's history log starts a new segment file once the current one is this big
+SEGMENT_BYTES = int(os.getenv("COPILOT_HISTORY_SEGMENT_KB", "256")) * 1024
+# fsync every append (survives power loss, not just a crashed or redeployed process)
+HISTORY_FSYNC = os.getenv("COPILOT_HISTORY_FSYNC", "0") == "1"
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Rough recursive size of a JSON-like structure in bytes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += deep_sizeof(v, seen)
+    return size
+
+
+class HistoryLog:
+    """
+    Append-only conversation log of one session, in numbered JSON Lines
+    segments under `directory`. Each segment opens with a header holding
+    the session state at that point, followed by one line per event:
+    - {"m": message, "turn": n}   a history message
+    - {"checkpoint": 1}           everything before was handed to the summariser
+    - {"set": {field: value}}     session state changed (profile, persona, filter)
+    load() reads only the newest segment(s), enough for the recent window,
+    so resuming a long conversation costs the same as a short one; older
+    segments stay on disk untouched.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES, fsync: bool = HISTORY_FSYNC):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.file = None
+        # Mirror of the state the next segment header must carry
+        self.state = {"turn_count": 0, "unsummarised": 0}
+
+    def _segments(self) -> list:
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(".jsonl"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in names]
+
+    @staticmethod
+    def _replay(path: str, state: dict) -> list:
+        """Messages of one segment; applies its header and events to `state`."""
+        messages = []
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash mid-write
+                if "m" in event:
+                    messages.append(event["m"])
+                    state["turn_count"] = event.get("turn", state["turn_count"])
+                    state["unsummarised"] += 1
+                elif "checkpoint" in event:
+                    state["unsummarised"] = 0
+                elif "set" in event:
+                    state.update(event["set"])
+                elif "state" in event:
+                    state.update(event["state"])
+        return messages
+
+    def load(self, window: int):
+        """
+        (messages, state) for resuming: every message not yet summarised
+        plus `window` before them. None if nothing was logged.
+        """
+        segments = self._segments()
+        if not segments:
+            return None
+        messages = self._replay(segments[-1], self.state)
+        need = window + self.state["unsummarised"]
+        older = len(segments) - 1
+        while len(messages) < need and older > 0:
+            older -= 1
+            messages = self._replay(segments[older], dict(self.state)) + messages
+        return messages[-need:], dict(self.state)
+
+    def _write(self, event: dict):
+        if self.file is None:
+            self._reopen()
+        if self.file is None or self.file.tell() >= self.segment_bytes:
+            self._roll()
+        self.file.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def _reopen(self):
+        """Keep appending to the newest segment after a restart, if it has room."""
+        segments = self._segments()
+        size = os.path.getsize(segments[-1]) if segments else self.segment_bytes
+        if size >= self.segment_bytes:
+            return
+        with open(segments[-1], "rb") as f:
+            f.seek(max(0, size - 1))
+            torn = f.read(1) not in (b"\n", b"")
+        self.file = open(segments[-1], "a")
+        if torn:
+            self.file.write("\n")
+
+    def _roll(self):
+        """Start the next segment, opening with the current state."""
+        segments = self._segments()
+        if self.file is not None:
+            self.file.close()
+        number = int(os.path.basename(segments[-1])[:-6]) + 1 if segments else 1
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(os.path.join(self.directory, f"{number:06d}.jsonl"), "a")
+        self.file.write(json.dumps({"state": self.state}, separators=(",", ":")) + "\n")
+
+    def append(self, message: dict, turn: int):
+        self.state["turn_count"] = turn
+        self.state["unsummarised"] += 1
+        self._write({"m": message, "turn": turn})
+
+    def checkpoint(self):
+        self.state["unsummarised"] = 0
+        self._write({"checkpoint": 1})
+
+    def set(self, **fields):
+        self.state.update(fields)
+        self._write({"set": fields})
+
+    def clear(self):
+        """Drop every segment (the conversation was wiped)."""
+        self.close()
+        for path in self._segments():
+            os.remove(path)
+        self.state.update(unsummarised=0)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SessionRegistry:
+    """
+    Lazily creates one Copilot per session id.
+    - at most `max_sessions` live in RAM (least recently used evicted first)
+    - sessions idle for longer than `ttl_seconds` are evicted
+    - every message is appended to the session's HistoryLog as it happens,
+      so a restart or crash loses nothing; a session is resumed from its
+      log's recent window on next use, never loaded eagerly
+    """
+
+    def __init__(self, factory, max_sessions: int = 256, ttl_seconds: float = 1800,
+                 session_dir: str = SESSION_DIR):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.session_dir = session_dir
+        os.makedirs(session_dir, exist_ok=True)
+
+        # session_id -> (bot, last_used); ordered oldest -> newest use
+        self.sessions = OrderedDict()
+        self.evictions = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def valid_id(session_id) -> bool:
+        return bool(session_id) and bool(SESSION_ID_RE.match(session_id))
+
+    def _path(self, session_id: str) -> str:
+        """Parked state from before history logs (migrated on next use)."""
+        return os.path.join(self.session_dir, f"{session_id}.json")
+
+    def _log_dir(self, session_id: str) -> str:
+        return os.path.join(self.session_dir, session_id)
+
+    # ---------- LOOKUP ----------
+
+    def get(self, session_id: str):
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        entry = self.sessions.pop(session_id, None)
+        bot = entry[0] if entry else self._restore(session_id)
+        self.sessions[session_id] = (bot, now)
+
+        while len(self.sessions) > self.max_sessions:
+            old_id, (old_bot, _) = self.sessions.popitem(last=False)
+            self._persist(old_id, old_bot)
+        return bot
+
+    def _restore(self, session_id: str):
+        bot = self.factory()
+        log = HistoryLog(self._log_dir(session_id))
+        path = self._path(session_id)
+        try:
+            if os.path.exists(path) and not log._segments():
+                with open(path, "r") as f:
+                    bot.load_state(json.load(f))
+                bot.attach_log(log, resume=False)
+                os.remove(path)
+            else:
+                bot.attach_log(log)
+        except Exception as e:
+            print(f"Failed to restore session {session_id}:", e)
+        return bot
+
+    # ---------- EVICTION ----------
+
+    def _evict_expired(self, now: float):
+        # Oldest use is always at the front, so stop at the first fresh one
+        while self.sessions:
+            session_id, (bot, last_used) = next(iter(self.sessions.items()))
+            if now - last_used < self.ttl_seconds:
+                break
+            self.sessions.popitem(last=False)
+            self._persist(session_id, bot)
+
+    def _persist(self, session_id: str, bot):
+        # Already on disk, message by message: just release the log file
+        self.evictions += 1
+        if bot.log is not None:
+            bot.log.close()
+
+    def close(self):
+        """Release every live session (call on shutdown)."""
+        while self.sessions:
+            session_id, (bot, _) = self.sessions.popitem(last=False)
+            self._persist(session_id, bot)
+
+    # ---------- REPORTING ----------
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        sessions = []
+        for session_id, (bot, last_used) in self.sessions.items():
+            sessions.append({
+                "id": session_id,
+                "turns": bot.turn_count,
+                "messages": len(bot.history),
+                "active_profile": bot.active_profile,
+                "persona": bot.persona,
+                "idle_seconds": round(now - last_used, 1),
+                "bytes": deep_sizeof(bot.export_state()),
+            })
+        return {
+            "live": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+            "total_bytes": sum(s["bytes"] for s in sessions),
+            "sessions": sessions,
+        }
@@ -0,0 +1,880 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): single-process use only
+    fcntl = None
+
+MEMORY_DIR = "memory"
+
+
+def atomic_write(path: str, text: str):
+    """Write to a temp file and rename over `path`, so a crash never leaves half a file."""
+    # A unique temp name: writers in other processes never share one
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def try_lock(path: str):
+    """
+    Take an exclusive advisory lock on `path` without waiting.
+    Returns the open handle (keep it; closing it or exiting releases the
+    lock), or None if another process holds it.
+    """
+    f = open(path, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class StoreInUse(RuntimeError):
+    pass
+
+
+def _matches(item: dict, substring: str) -> bool:
+    return substring in item.get("text", "").lower()
+
+
+class JsonStore:
+    """
+    The original format: one JSON array per profile, rewritten in full
+    whenever the profile has changed. MemoryManager calls:
+    - load(profile) once at startup
+    - record_add / record_forget / record_remove / record_wipe as mutations happen
+    - record_touch when items' usage stats (last_used, uses) change
+    - save(profile, items) from save_all for each changed profile
+    - rewrite(profile, items) to replace a profile wholesale (e.g. once
+      legacy items have been given ids)
+    - load_tasks / add_task / clear_tasks for the task list
+    - load_summaries / add_summary / replace_summaries / clear_summaries
+      for the rolling conversation summaries
+    Usage stats are appended to memory/<profile>.usage.jsonl and replayed
+    on load, so using an item never rewrites its profile; the next save of
+    the profile carries them and empties the sidecar.
+
+    Each process would rewrite the files from its own copy, so the
+    directory is locked to one process (use SqliteStore for several workers).
+    """
+
+    name = "json"
+    # MemoryManager numbers items itself; SqliteStore uses its row ids
+    assigns_ids = False
+    # save() serialises the whole profile, so MemoryManager hands it a copy
+    # and writes it outside its lock
+    saves_copies = True
+
+    # Usage sidecar lines kept before it is rewritten with the latest per item
+    USAGE_COMPACT_LINES = 10000
+
+    def __init__(self, memory_dir: str = MEMORY_DIR, exclusive: bool = True):
+        self.memory_dir = memory_dir
+        os.makedirs(memory_dir, exist_ok=True)
+        self.usage_lines = {}  # profile -> lines in its usage sidecar
+        self.owner = None
+        if exclusive:
+            self.owner = try_lock(os.path.join(memory_dir, ".store.lock"))
+            if self.owner is None:
+                raise StoreInUse(
+                    f"{memory_dir}/ is already used by another process. To run several "
+                    "workers, share it through SQLite: COPILOT_MEMORY_STORE=sqlite."
+                )
+
+    def _path(self, profile: str) -> str:
+        return os.path.join(self.memory_dir, f"{profile}.json")
+
+    def _usage_path(self, profile: str) -> str:
+        return os.path.join(self.memory_dir, f"{profile}.usage.jsonl")
+
+    def load(self, profile: str) -> list:
+        items = self._load_array(profile)
+        usage = self._load_usage(profile)
+        if usage:
+            for item in items:
+                stats = usage.get(item.get("id"))
+                if stats is not None:
+                    item.update(stats)
+        return items
+
+    def _load_usage(self, profile: str) -> dict:
+        """id -> latest {last_used, uses} from the usage sidecar."""
+        usage = {}
+        lines = 0
+        path = self._usage_path(profile)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-append
+                        continue
+                    usage[entry.pop("id")] = entry
+                    lines += 1
+        self.usage_lines[profile] = lines
+        return usage
+
+    def _load_array(self, profile: str) -> list:
+        path = self._path(profile)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            # Keep the unreadable file aside instead of overwriting it on the next save
+            print(f"Failed to load memory for {profile}, moved to {path}.corrupt:", e)
+            try:
+                os.replace(path, path + ".corrupt")
+            except Exception:
+                pass
+            return []
+
+    def record_add(self, profile: str, item: dict):
+        pass
+
+    def record_forget(self, profile: str, substring: str):
+        pass
+
+    def record_remove(self, profile: str, ids: list):
+        pass
+
+    def record_touch(self, profile: str, items: list):
+        with open(self._usage_path(profile), "a") as f:
+            for item in items:
+                f.write(json.dumps({"id": item["id"], "last_used": item["last_used"],
+                                    "uses": item["uses"]}, separators=(",", ":")) + "\n")
+        self.usage_lines[profile] = self.usage_lines.get(profile, 0) + len(items)
+        if self.usage_lines[profile] >= self.USAGE_COMPACT_LINES:
+            # Only the latest line per item matters
+            usage = self._load_usage(profile)
+            atomic_write(self._usage_path(profile), "".join(
+                json.dumps({"id": item_id, **stats}, separators=(",", ":")) + "\n"
+                for item_id, stats in usage.items()))
+            self.usage_lines[profile] = len(usage)
+
+    def _drop_usage(self, profile: str):
+        path = self._usage_path(profile)
+        if os.path.exists(path):
+            os.remove(path)
+        self.usage_lines[profile] = 0
+
+    def record_wipe(self, profile: str):
+        path = self._path(profile)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+            self._drop_usage(profile)
+        except Exception:
+            pass
+
+    def save(self, profile: str, items: list):
+        atomic_write(self._path(profile), json.dumps(items, indent=2))
+        # The profile now holds the latest usage stats itself
+        self._drop_usage(profile)
+
+    def rewrite(self, profile: str, items: list):
+        self.save(profile, items)
+
+    # ---------- TASKS ----------
+
+    def load_tasks(self) -> list:
+        path = os.path.join(self.memory_dir, "tasks.json")
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print("Failed to load tasks:", e)
+            return []
+
+    def _save_tasks(self, tasks: list):
+        atomic_write(os.path.join(self.memory_dir, "tasks.json"), json.dumps(tasks, indent=2))
+
+    def add_task(self, text: str, created_at: float) -> int:
+        """Append a task (written at once); returns how many there are now."""
+        tasks = self.load_tasks() + [{"text": text, "created_at": created_at}]
+        self._save_tasks(tasks)
+        return len(tasks)
+
+    def clear_tasks(self) -> int:
+        tasks = self.load_tasks()
+        if tasks:
+            self._save_tasks([])
+        return len(tasks)
+
+    # ---------- SUMMARIES ----------
+
+    def _summaries_path(self) -> str:
+        return os.path.join(self.memory_dir, "summaries.json")
+
+    def load_summaries(self) -> list:
+        """[{id, level, text, created_at}, ...], oldest (most condensed) first."""
+        path = self._summaries_path()
+        legacy = os.path.join(self.memory_dir, "summary.txt")
+        summaries = []
+        try:
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    summaries = json.load(f)
+            elif os.path.exists(legacy):
+                # Single summary from before the rolling ones: keep it as the oldest, condensed entry
+                with open(legacy, "r") as f:
+                    text = f.read().strip()
+                if text:
+                    summaries = [{"level": 1, "text": text, "created_at": os.path.getmtime(legacy)}]
+        except Exception as e:
+            print("Failed to load summaries:", e)
+        for i, entry in enumerate(summaries, 1):
+            entry.setdefault("id", i)
+        return summaries
+
+    def _save_summaries(self, summaries: list):
+        atomic_write(self._summaries_path(), json.dumps(summaries, indent=2))
+
+    def add_summary(self, entry: dict):
+        """Append `entry` (written at once), giving it an id."""
+        summaries = self.load_summaries()
+        entry["id"] = 1 + max((s["id"] for s in summaries), default=0)
+        self._save_summaries(summaries + [entry])
+
+    def replace_summaries(self, ids: list, entry: dict) -> bool:
+        """Swap the summaries `ids` for `entry` in their place; False if any is gone."""
+        summaries = self.load_summaries()
+        positions = [i for i, s in enumerate(summaries) if s["id"] in ids]
+        if len(positions) != len(ids):
+            return False
+        entry["id"] = 1 + max(s["id"] for s in summaries)
+        kept = [s for s in summaries if s["id"] not in ids]
+        kept.insert(positions[0], entry)
+        self._save_summaries(kept)
+        return True
+
+    def clear_summaries(self):
+        for path in (self._summaries_path(), os.path.join(self.memory_dir, "summary.txt")):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
+    def close(self):
+        if self.owner is not None:
+            self.owner.close()
+            self.owner = None
+
+
+class JournalStore(JsonStore):
+    """
+    Append-only storage: every add / forget / removal / touch is appended as one
+    JSON line to memory/<profile>.jsonl, so a write costs O(1) however
+    large the profile is. On startup the snapshot (memory/<profile>.snapshot.json)
+    is loaded and the journal replayed on top of it. Once a journal holds
+    `compact_every` operations, save() folds it into a fresh snapshot.
+
+    Snapshot and journal carry a generation number; a journal is only
+    replayed onto the snapshot of the same generation, so a crash between
+    writing a snapshot and resetting the journal cannot apply ops twice.
+    """
+
+    name = "journal"
+    # Compaction must see exactly the ops journalled so far: save under the lock
+    saves_copies = False
+
+    def __init__(self, memory_dir: str = MEMORY_DIR, compact_every: int = 5000, exclusive: bool = True):
+        super().__init__(memory_dir, exclusive)
+        self.compact_every = compact_every
+        self.journals = {}  # profile -> open append handle
+        self.ops = {}  # profile -> operations since the last snapshot
+        self.generations = {}  # profile -> current snapshot generation
+
+    def _journal_path(self, profile: str) -> str:
+        return os.path.join(self.memory_dir, f"{profile}.jsonl")
+
+    def _snapshot_path(self, profile: str) -> str:
+        return os.path.join(self.memory_dir, f"{profile}.snapshot.json")
+
+    def load(self, profile: str) -> list:
+        items = []
+        generation = 0
+        snapshot = self._snapshot_path(profile)
+        if os.path.exists(snapshot):
+            with open(snapshot, "r") as f:
+                data = json.load(f)
+            items = data["items"]
+            generation = data["generation"]
+        elif os.path.exists(self._path(profile)):
+            # First run after switching from JsonStore: start from the old array
+            items = super().load(profile)
+        self.generations[profile] = generation
+
+        ops = 0
+        by_id = None  # id -> item for replaying touches, rebuilt after removals
+        journal = self._journal_path(profile)
+        if os.path.exists(journal):
+            with open(journal, "r") as f:
+                header = f.readline()
+                try:
+                    current = json.loads(header).get("generation") == generation
+                except ValueError:
+                    current = False
+                for line in f if current else ():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-append
+                        continue
+                    op = entry.get("op")
+                    if op == "add":
+                        items.append(entry["item"])
+                        if by_id is not None:
+                            by_id[entry["item"].get("id")] = entry["item"]
+                    elif op == "forget":
+                        items = [i for i in items if not _matches(i, entry["match"])]
+                    elif op == "remove":
+                        gone = set(entry["ids"])
+                        items = [i for i in items if i.get("id") not in gone]
+                    elif op == "touch":
+                        if by_id is None:
+                            by_id = {i.get("id"): i for i in items}
+                        item = by_id.get(entry["id"])
+                        if item is not None:
+                            item.update(last_used=entry["last_used"], uses=entry["uses"])
+                    if op in ("forget", "remove"):
+                        by_id = None
+                    ops += 1
+            if not current:
+                # Stale journal, already folded into the snapshot
+                self._reset_journal(profile)
+        self.ops[profile] = ops
+        return items
+
+    def _reset_journal(self, profile: str):
+        header = json.dumps({"generation": self.generations.get(profile, 0)}) + "\n"
+        atomic_write(self._journal_path(profile), header)
+
+    def _append(self, profile: str, entry: dict):
+        f = self.journals.get(profile)
+        if f is None:
+            if not os.path.exists(self._journal_path(profile)):
+                self._reset_journal(profile)
+            f = self.journals[profile] = open(self._journal_path(profile), "a")
+        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.ops[profile] = self.ops.get(profile, 0) + 1
+
+    def record_add(self, profile: str, item: dict):
+        self._append(profile, {"op": "add", "item": item})
+
+    def record_forget(self, profile: str, substring: str):
+        self._append(profile, {"op": "forget", "match": substring})
+
+    def record_remove(self, profile: str, ids: list):
+        self._append(profile, {"op": "remove", "ids": list(ids)})
+
+    def record_touch(self, profile: str, items: list):
+        for item in items:
+            self._append(profile, {"op": "touch", "id": item["id"],
+                                   "last_used": item["last_used"], "uses": item["uses"]})
+
+    def record_wipe(self, profile: str):
+        # Nothing left to replay, so start over with an empty snapshot
+        self.compact(profile, [])
+
+    def save(self, profile: str, items: list):
+        if self.ops.get(profile, 0) >= self.compact_every:
+            self.compact(profile, items)
+            return
+        f = self.journals.get(profile)
+        if f is not None:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rewrite(self, profile: str, items: list):
+        self.compact(profile, items)
+
+    def compact(self, profile: str, items: list):
+        """Write `items` as the next-generation snapshot and start an empty journal."""
+        f = self.journals.pop(profile, None)
+        if f is not None:
+            f.close()
+        generation = self.generations.get(profile, 0) + 1
+        snapshot = {"generation": generation, "items": items}
+        atomic_write(self._snapshot_path(profile), json.dumps(snapshot, separators=(",", ":")))
+        self.generations[profile] = generation
+        self._reset_journal(profile)
+        self.ops[profile] = 0
+
+    def close(self):
+        for f in self.journals.values():
+            f.close()
+        self.journals.clear()
+        super().close()
+
+
+class SqliteStore:
+    """
+    One SQLite database (memory/memory.db) in WAL mode holding every profile.
+    - each item is a row with an integer id and created_at; keys beyond
+      text/source (last_used, uses, pinned, ...) are kept as JSON in `data`
+    - adds / forgets / wipes touch only the affected rows and commit at
+      once, so a flush costs nothing and other processes see them
+    - an FTS5 trigram index answers substring matches for forget
+      (find_matching) without scanning every item
+    - (profile, id) is indexed, so loading or wiping a profile is a range scan
+    - every insert / delete is logged in `changes`; changes() hands a
+      process the ones it hasn't seen, so several workers can share the file
+    - the task list is a table too, read fresh on every call, so every
+      worker sees every task
+    - so are the rolling summaries; their inserts / deletes go into the
+      change log as well, so every worker reloads them when they change
+    On first open, the existing JSON / journal files of `profiles` (and
+    tasks.json, summaries.json) are imported once; without `profiles`
+    nothing is migrated.
+    """
+
+    name = "sqlite"
+    assigns_ids = True
+    saves_copies = False
+
+    # Change log entries kept for workers that fall behind (they reload past this)
+    CHANGE_LOG_ROWS = 50000
+
+    # Bulk inserts at least this big index FTS in one statement afterwards
+    # rather than row by row from the trigger (about 4x cheaper)
+    BULK_FTS_ROWS = 500
+
+    # PRAGMA user_version once every migration below has run
+    VERSION = 4
+
+    # Rows an earlier import took from files that are not profiles
+    STRAY_PROFILES = ("summary", "summaries", "tasks")
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS summaries (
+            id INTEGER PRIMARY KEY,
+            level INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            profile TEXT NOT NULL,
+            text TEXT NOT NULL,
+            source TEXT,
+            created_at REAL NOT NULL,
+            data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS items_profile_id ON items (profile, id);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            profile TEXT NOT NULL,
+            item_id INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS items_log_add AFTER INSERT ON items BEGIN
+            INSERT INTO changes (op, profile, item_id) VALUES ('add', new.profile, new.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS items_log_delete AFTER DELETE ON items BEGIN
+            INSERT INTO changes (op, profile, item_id) VALUES ('delete', old.profile, old.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS summaries_log_add AFTER INSERT ON summaries BEGIN
+            INSERT INTO changes (op, profile, item_id) VALUES ('summary', '', new.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS summaries_log_delete AFTER DELETE ON summaries BEGIN
+            INSERT INTO changes (op, profile, item_id) VALUES ('summary', '', old.id);
+        END;
+    """
+
+    FTS_ADD_TRIGGER = """
+        CREATE TRIGGER IF NOT EXISTS items_fts_add AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+    """
+
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            text, content='items', content_rowid='id', tokenize='trigram'
+        );
+    """ + FTS_ADD_TRIGGER + """
+        CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+    """
+
+    def __init__(self, memory_dir: str = MEMORY_DIR, path: str = None, profiles: list = None):
+        self.memory_dir = memory_dir
+        os.makedirs(memory_dir, exist_ok=True)
+        self.path = path or os.path.join(memory_dir, "memory.db")
+        # Shared by the event loop and the flush timer; `lock` serialises use.
+        # Other processes hold the write lock only for one statement, so wait for it.
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+        # Schema + one-off import under the write lock, so workers starting
+        # together neither race on DDL nor import the legacy files twice
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self._script(self.SCHEMA)
+            try:
+                self._script(self.FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                print("SQLite FTS5 trigram index unavailable, forget will scan:", e)
+                self.fts = False
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if profiles is not None and version < self.VERSION:
+                if version < 1:
+                    self.import_legacy(profiles)
+                if version < 2:
+                    self.import_tasks()
+                if version < 3:
+                    self.db.execute(
+                        f"DELETE FROM items WHERE profile IN ({', '.join('?' * len(self.STRAY_PROFILES))})",
+                        self.STRAY_PROFILES)
+                if version < 4:
+                    self.import_summaries()
+                self.db.execute(f"PRAGMA user_version = {self.VERSION}")
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+        # Anything logged after this point is replayed by changes(); replaying
+        # an add or delete that load() already reflects is a no-op
+        self.last_seq = self._max_seq()
+        self.data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _script(self, sql: str):
+        # executescript() would commit the open transaction first, so run statements one by one
+        statement = ""
+        for line in sql.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                self.db.execute(statement)
+                statement = ""
+
+    # ---------- MIGRATION ----------
+
+    def import_legacy(self, profiles: list):
+        """
+        Copy `profiles` from JsonStore / JournalStore files into the database
+        (non-destructive). Other files in the directory (summaries, tasks,
+        sessions) are not profiles and are left alone.
+        """
+        legacy = JournalStore(self.memory_dir, exclusive=False)
+        imported = 0
+        for profile in profiles:
+            try:
+                items = legacy.load(profile)
+            except Exception as e:
+                print(f"Failed to import legacy memory for {profile}:", e)
+                continue
+            for item in items:
+                if item.get("id") is None and item.get("source") == "user":
+                    # From before ids: an explicit `remember:`, pinned like new ones
+                    item["pinned"] = True
+                self._insert(profile, item)
+            imported += len(items)
+        legacy.close()
+        if imported:
+            print(f"Imported {imported} memory item(s) into {self.path}.")
+
+    def import_tasks(self):
+        """Copy tasks.json (the task list from before it moved into the store)."""
+        tasks = JsonStore(self.memory_dir, exclusive=False).load_tasks()
+        self.db.executemany("INSERT INTO tasks (text, created_at) VALUES (?, ?)",
+                            [(task["text"], task.get("created_at") or time.time()) for task in tasks])
+
+    def import_summaries(self):
+        """Copy summaries.json (or summary.txt), from before summaries moved into the store."""
+        summaries = JsonStore(self.memory_dir, exclusive=False).load_summaries()
+        self.db.executemany("INSERT INTO summaries (level, text, created_at) VALUES (?, ?, ?)",
+                            [(s["level"], s["text"], s["created_at"]) for s in summaries])
+
+    # ---------- ROWS ----------
+
+    @staticmethod
+    def _data(item: dict):
+        extra = {k: v for k, v in item.items() if k not in ("id", "text", "source", "created_at")}
+        return json.dumps(extra) if extra else None
+
+    def _insert(self, profile: str, item: dict):
+        item.setdefault("created_at", time.time())
+        cur = self.db.execute(
+            "INSERT INTO items (id, profile, text, source, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (item.get("id"), profile, item.get("text", ""), item.get("source"), item["created_at"],
+             self._data(item)),
+        )
+        item["id"] = cur.lastrowid
+
+    @staticmethod
+    def _item(row) -> dict:
+        item_id, text, source, created_at, data = row
+        item = {"id": item_id, "text": text, "source": source, "created_at": created_at}
+        if data:
+            item.update(json.loads(data))
+        return item
+
+    def _matching_ids(self, substring: str, profile: str = None) -> list:
+        """Ids of items whose text contains `substring` (case-insensitive)."""
+        where, args = "", []
+        if profile is not None:
+            where, args = " AND profile = ?", [profile]
+        if self.fts and len(substring) >= 3:
+            # A quoted trigram phrase matches exactly the texts containing it
+            phrase = '"' + substring.replace('"', '""') + '"'
+            sql = ("SELECT id, profile FROM items WHERE id IN "
+                   "(SELECT rowid FROM items_fts WHERE items_fts MATCH ?)" + where)
+            return self.db.execute(sql, [phrase] + args).fetchall()
+        sql = "SELECT id, profile FROM items WHERE instr(lower(text), ?) > 0" + where
+        return self.db.execute(sql, [substring.lower()] + args).fetchall()
+
+    def _max_seq(self) -> int:
+        return self.db.execute("SELECT coalesce(max(seq), 0) FROM changes").fetchone()[0]
+
+    # ---------- STORE INTERFACE ----------
+
+    def load(self, profile: str) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, text, source, created_at, data FROM items WHERE profile = ? ORDER BY id",
+                (profile,),
+            ).fetchall()
+        return [self._item(row) for row in rows]
+
+    def find_matching(self, substring: str) -> dict:
+        """{profile: set of item ids} whose text contains `substring`."""
+        matches = {}
+        with self.lock:
+            for item_id, profile in self._matching_ids(substring):
+                matches.setdefault(profile, set()).add(item_id)
+        return matches
+
+    def changes(self):
+        """
+        Adds / deletes committed since the last call, as a list of
+        ("add", profile, item), ("delete", profile, item_id) and
+        ("summary", "", summary_id) (the summaries changed), oldest first.
+        Cheap when nothing changed (one PRAGMA). Returns None if the log was
+        trimmed past this reader, meaning: reload everything.
+        """
+        with self.lock:
+            version = self.db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return []
+            self.data_version = version
+
+            oldest = self.db.execute("SELECT min(seq) FROM changes").fetchone()[0]
+            if oldest is not None and oldest > self.last_seq + 1:
+                self.last_seq = self._max_seq()
+                return None
+            log = self.db.execute(
+                "SELECT seq, op, profile, item_id FROM changes WHERE seq > ? ORDER BY seq",
+                (self.last_seq,),
+            ).fetchall()
+            if not log:
+                return []
+            self.last_seq = log[-1][0]
+
+            added = [item_id for _, op, _, item_id in log if op == "add"]
+            items = {}
+            for i in range(0, len(added), 500):
+                chunk = added[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for row in self.db.execute(
+                        f"SELECT id, text, source, created_at, data FROM items WHERE id IN ({marks})", chunk):
+                    items[row[0]] = self._item(row)
+
+        result = []
+        for _, op, profile, item_id in log:
+            if op in ("delete", "summary"):
+                result.append((op, profile, item_id))
+            elif item_id in items:
+                # Added and already deleted again: the delete follows in the log
+                result.append(("add", profile, items[item_id]))
+        return result
+
+    def record_add(self, profile: str, item: dict):
+        with self.lock:
+            self._insert(profile, item)
+
+    def record_add_many(self, rows):
+        """Insert (profile, item) pairs in one transaction (bulk import)."""
+        rows = list(rows)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                # Nobody else can write now: if we were up to date, every log
+                # entry this adds is ours and already in memory, so skip them
+                current = self.last_seq == self._max_seq()
+                bulk_fts = self.fts and len(rows) >= self.BULK_FTS_ROWS
+                if bulk_fts:
+                    # Schema changes are transactional: other writers never see the trigger missing
+                    self.db.execute("DROP TRIGGER items_fts_add")
+                    before = self.db.execute("SELECT coalesce(max(id), 0) FROM items").fetchone()[0]
+                for profile, item in rows:
+                    self._insert(profile, item)
+                if bulk_fts:
+                    ids = [item["id"] for _, item in rows]
+                    if min(ids) > before:
+                        self.db.execute("INSERT INTO items_fts (rowid, text) "
+                                        "SELECT id, text FROM items WHERE id > ?", (before,))
+                    else:
+                        self.db.executemany("INSERT INTO items_fts (rowid, text) "
+                                            "SELECT id, text FROM items WHERE id = ?", [(i,) for i in ids])
+                    self._script(self.FTS_ADD_TRIGGER)
+                if current:
+                    self.last_seq = self._max_seq()
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def record_forget(self, profile: str, substring: str):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            ids = [(item_id,) for item_id, _ in self._matching_ids(substring, profile)]
+            self.db.executemany("DELETE FROM items WHERE id = ?", ids)
+            self.db.execute("COMMIT")
+
+    def record_remove(self, profile: str, ids: list):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in ids])
+            self.db.execute("COMMIT")
+
+    def record_touch(self, profile: str, items: list):
+        # Usage stats aren't in the change log: other workers keep their own
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("UPDATE items SET data = ? WHERE id = ?",
+                                [(self._data(item), item["id"]) for item in items])
+            self.db.execute("COMMIT")
+
+    def record_wipe(self, profile: str):
+        with self.lock:
+            self.db.execute("DELETE FROM items WHERE profile = ?", (profile,))
+
+    def save(self, profile: str, items: list):
+        # Every change is committed as it happens; just keep the change log bounded
+        with self.lock:
+            self.db.execute("DELETE FROM changes WHERE seq <= ?",
+                            (self._max_seq() - self.CHANGE_LOG_ROWS,))
+
+    # ---------- TASKS ----------
+
+    def load_tasks(self) -> list:
+        with self.lock:
+            rows = self.db.execute("SELECT text, created_at FROM tasks ORDER BY id").fetchall()
+        return [{"text": text, "created_at": created_at} for text, created_at in rows]
+
+    def add_task(self, text: str, created_at: float) -> int:
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("INSERT INTO tasks (text, created_at) VALUES (?, ?)", (text, created_at))
+            count = self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            self.db.execute("COMMIT")
+        return count
+
+    def clear_tasks(self) -> int:
+        with self.lock:
+            return self.db.execute("DELETE FROM tasks").rowcount
+
+    # ---------- SUMMARIES ----------
+
+    # Rows change one statement / transaction at a time, so two workers
+    # summarising at once never overwrite each other's summaries
+
+    def load_summaries(self) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, level, text, created_at FROM summaries ORDER BY created_at, id").fetchall()
+        return [{"id": id_, "level": level, "text": text, "created_at": created_at}
+                for id_, level, text, created_at in rows]
+
+    def add_summary(self, entry: dict):
+        with self.lock:
+            cur = self.db.execute("INSERT INTO summaries (level, text, created_at) VALUES (?, ?, ?)",
+                                  (entry["level"], entry["text"], entry["created_at"]))
+            entry["id"] = cur.lastrowid
+
+    def replace_summaries(self, ids: list, entry: dict) -> bool:
+        """
+        Delete `ids` and insert `entry` in one transaction; False (and no
+        change) if another worker got to any of them first. `entry` keeps the
+        newest created_at of the group, so it sorts where the group was.
+        """
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                marks = ",".join("?" * len(ids))
+                gone = self.db.execute(f"DELETE FROM summaries WHERE id IN ({marks})", list(ids)).rowcount
+                if gone != len(ids):
+                    self.db.execute("ROLLBACK")
+                    return False
+                cur = self.db.execute("INSERT INTO summaries (level, text, created_at) VALUES (?, ?, ?)",
+                                      (entry["level"], entry["text"], entry["created_at"]))
+                entry["id"] = cur.lastrowid
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return True
+
+    def clear_summaries(self):
+        with self.lock:
+            self.db.execute("DELETE FROM summaries")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+STORES = {
+    "json": JsonStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+}
+
+
+def open_store(name: str = None, memory_dir: str = MEMORY_DIR, profiles: list = None):
+    """
+    Build the storage backend named by `name` or $COPILOT_MEMORY_STORE (default json).
+    `profiles` are the profile names SqliteStore may import from older files.
+    """
+    name = name or os.getenv("COPILOT_MEMORY_STORE", "json")
+    if name not in STORES:
+        raise ValueError(f"Unknown memory store '{name}'. Available: {', '.join(STORES)}.")
+    if name == "sqlite":
+        return SqliteStore(memory_dir, profiles=profiles)
+    return STORES[name](memory_dir)
@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+
+from context import count_tokens
+
+# Summaries of one level condensed together once there are more than this many
+SUMMARY_FANOUT = int(os.getenv("COPILOT_SUMMARY_FANOUT", "4"))
+# Highest level: beyond it, old summaries keep being folded into the same level
+SUMMARY_MAX_LEVEL = int(os.getenv("COPILOT_SUMMARY_MAX_LEVEL", "2"))
+
+
+def transcript(messages: list) -> str:
+    """Plain-text USER / COPILOT transcript of history messages."""
+    lines = []
+    for msg in messages:
+        parts = msg.get("parts", [""])
+        text = parts[0] if parts else ""
+        role_label = "USER" if msg.get("role", "user") == "user" else "COPILOT"
+        lines.append(f"{role_label}: {text}")
+    return "\n".join(lines)
+
+
+def update_prompt(previous: str, messages: list) -> str:
+    """Summarise only the new turns, with the latest summary for context."""
+    context = f"Summary so far (for context only):\n{previous}\n\n" if previous else ""
+    return (
+        "You are a neutral summariser.\n"
+        "Summarise the NEW conversation turns below in 3–8 bullet points.\n"
+        "Focus on: user preferences, facts, decisions, goals, and ongoing tasks.\n"
+        "Do not repeat points already in the summary so far.\n"
+        "Do NOT imitate any persona or style. Write neutrally.\n\n"
+        f"{context}New conversation turns:\n{transcript(messages)}"
+    )
+
+
+def condense_prompt(summaries: list) -> str:
+    """Fold consecutive summaries into one shorter one."""
+    joined = "\n\n".join(f"Part {i}:\n{text}" for i, text in enumerate(summaries, 1))
+    return (
+        "You are a neutral summariser.\n"
+        "Condense these consecutive conversation summaries (oldest first) into 4–8 bullet points.\n"
+        "Keep lasting facts, preferences, goals and open tasks; drop details that were resolved.\n"
+        "Do NOT imitate any persona or style. Write neutrally.\n\n"
+        f"{joined}"
+    )
+
+
+class SummaryWorker:
+    """
+    Runs summarisation jobs on a background thread so the reply that
+    triggered them is returned straight away.
+    - a job is the history messages not yet summarised; a newer trigger for
+      the same key (session) while one is pending is merged into it, so it
+      becomes one model call covering both
+    - each job summarises only its messages (plus the latest summary for
+      context) and adds the result to MemoryManager's rolling summaries;
+      once a level holds more than `fanout`, the oldest are condensed into
+      one summary a level up. Every call's input is bounded, however long
+      the conversation runs.
+    """
+
+    def __init__(self, model, fanout: int = SUMMARY_FANOUT, max_level: int = SUMMARY_MAX_LEVEL):
+        self.model = model
+        self.fanout = fanout
+        self.max_level = max_level
+        self.pending = OrderedDict()  # key -> (messages, memory)
+        self.cond = threading.Condition()
+        self.busy = False
+        self.closed = False
+        self.completed = 0
+        self.coalesced = 0
+        self.condensed = 0
+        self.input_tokens = 0  # prompt tokens sent to the model, all calls
+        self.thread = threading.Thread(target=self._loop, name="summariser", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, messages: list, memory):
+        with self.cond:
+            if key in self.pending:
+                self.coalesced += 1
+                messages = self.pending[key][0] + messages
+            self.pending[key] = (list(messages), memory)
+            self.cond.notify()
+
+    def _generate(self, prompt: str) -> str:
+        self.input_tokens += count_tokens(prompt)
+        resp = self.model.generate_content(
+            contents=[{"role": "user", "parts": [prompt]}]
+        )
+        return resp.text
+
+    def _summarise(self, messages: list, memory):
+        memory.add_summary(self._generate(update_prompt(memory.latest_summary(), messages)))
+        while True:
+            group = memory.condense_candidates(self.fanout, self.max_level)
+            if group is None:
+                return
+            level = min(group[0]["level"] + 1, self.max_level)
+            text = self._generate(condense_prompt([s["text"] for s in group]))
+            if not memory.replace_summaries(group, text, level):
+                return  # wiped meanwhile
+            self.condensed += 1
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                key, (messages, memory) = self.pending.popitem(last=False)
+                self.busy = True
+
+            try:
+                self._summarise(messages, memory)
+            except Exception as e:
+                print(f"Failed to summarise session {key}:", e)
+
+            with self.cond:
+                self.busy = False
+                self.completed += 1
+                self.cond.notify_all()
+
+    def drain(self, timeout: float = None) -> bool:
+        """Block until every queued job has finished."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+    def close(self, timeout: float = 30):
+        """Finish outstanding jobs, then stop the thread (call on shutdown)."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
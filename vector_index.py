@@ -0,0 +1,221 @@
+import os
+import re
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # semantic recall is optional
+    np = None
+
+from storage import MEMORY_DIR, try_lock
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+# word -> (buckets, signs) of its n-grams, per dim; words repeat far more than they vary
+_WORD_GRAMS = {}
+WORD_CACHE_SIZE = 200000
+
+
+def _word_grams(word: str, dim: int):
+    key = (word, dim)
+    grams = _WORD_GRAMS.get(key)
+    if grams is None:
+        buckets, signs = [], []
+        padded = f" {word} "
+        for n in (3, 4):
+            for i in range(len(padded) - n + 1):
+                h = zlib.crc32(padded[i:i + n].encode())
+                buckets.append(h % dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        if len(_WORD_GRAMS) >= WORD_CACHE_SIZE:
+            _WORD_GRAMS.clear()
+        grams = _WORD_GRAMS[key] = (buckets, signs)
+    return grams
+
+
+def embed(text: str, dim: int = 256):
+    """
+    Offline embedding: hashed character 3- and 4-grams of each word,
+    signed into `dim` buckets and L2-normalised. Deterministic across runs
+    (crc32, not Python's salted hash) so stored vectors stay valid.
+    Catches spelling / morphology variants ("revise", "revision") without
+    any model or network call.
+    """
+    buckets, signs = [], []
+    for word in WORD_RE.findall(text.lower()):
+        b, s = _word_grams(word, dim)
+        buckets += b
+        signs += s
+    if not buckets:
+        return np.zeros(dim, dtype=np.float32)
+    vec = np.bincount(buckets, weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    if norm:
+        vec /= norm
+    return vec
+
+
+class VectorIndex:
+    """
+    Cosine top-k over memory items, stored in a memory-mapped float32
+    matrix (memory/vectors.f32) so it costs page cache rather than heap.
+    Rows are appended as items are added; forgotten rows are zeroed and reused.
+    memory/vectors.keys holds a crc32 of each row's text so vectors are
+    reused on the next start instead of re-embedding everything.
+    The files are a cache owned by one process; other workers sharing the
+    directory keep their matrix in RAM instead.
+    """
+
+    def __init__(self, memory_dir: str = MEMORY_DIR, dim: int = 256):
+        self.dim = dim
+        self.owner = try_lock(os.path.join(memory_dir, "vectors.lock"))
+        self.path = os.path.join(memory_dir, "vectors.f32") if self.owner else None
+        self.keys_path = os.path.join(memory_dir, "vectors.keys")
+        self.capacity = 0
+        self.matrix = None
+        self.count = 0  # rows in use or freed (high-water mark)
+        self.free = []
+        self.rows = {}  # doc_id -> row
+        self.row_docs = {}  # row -> doc_id
+        self.payloads = {}
+        self.keys = np.zeros(0, dtype=np.uint32)
+        self.dirty = False
+        self._reusable = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ---------- STORAGE ----------
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity * 2, rows)
+        if self.path is None:
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.matrix is not None:
+                matrix[:self.capacity] = self.matrix
+            self.matrix = matrix
+        else:
+            if self.matrix is not None:
+                self.matrix.flush()
+                del self.matrix
+            with open(self.path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+            self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        keys = np.zeros(capacity, dtype=np.uint32)
+        keys[:len(self.keys)] = self.keys[:capacity]
+        self.keys = keys
+        self.capacity = capacity
+
+    def load(self, items):
+        """
+        Attach to the on-disk matrix and index (doc_id, text, payload) triples,
+        reusing stored vectors whose text checksum matches.
+        """
+        stored = 0
+        if self.path and os.path.exists(self.keys_path) and os.path.exists(self.path):
+            saved = np.fromfile(self.keys_path, dtype=np.uint32)
+            stored = min(len(saved), os.path.getsize(self.path) // (self.dim * 4))
+            self.keys = saved[:stored]
+            for row, key in enumerate(self.keys):
+                if key:
+                    self._reusable.setdefault(int(key), []).append(row)
+        self._ensure_capacity(max(stored, 1))
+        self.count = stored
+
+        for doc_id, text, payload in items:
+            self.add(doc_id, text, payload)
+
+        # Rows nobody claimed belong to items that no longer exist
+        for rows in self._reusable.values():
+            for row in rows:
+                self.matrix[row] = 0.0
+                self.keys[row] = 0
+                self.free.append(row)
+        self._reusable = {}
+        self.dirty = True
+
+    def flush(self):
+        if not self.dirty or self.matrix is None or self.path is None:
+            return
+        self.matrix.flush()
+        self.keys[:self.count].tofile(self.keys_path)
+        self.dirty = False
+
+    def close(self):
+        self.flush()
+        if self.owner is not None:
+            self.owner.close()
+            self.owner = None
+
+    # ---------- MUTATIONS ----------
+
+    def add(self, doc_id, text: str, payload=None):
+        key = zlib.crc32(text.encode()) or 1
+        reusable = self._reusable.get(key)
+        if reusable:
+            row = reusable.pop()
+        else:
+            if self.free:
+                row = self.free.pop()
+            else:
+                row = self.count
+                self.count += 1
+                self._ensure_capacity(self.count)
+            self.matrix[row] = embed(text, self.dim)
+        self.keys[row] = key
+        self.rows[doc_id] = row
+        self.row_docs[row] = doc_id
+        self.payloads[doc_id] = payload
+        self.dirty = True
+
+    def remove(self, doc_id):
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        self.payloads.pop(doc_id, None)
+        del self.row_docs[row]
+        self.matrix[row] = 0.0
+        self.keys[row] = 0
+        self.free.append(row)
+        self.dirty = True
+
+    def clear(self):
+        for doc_id in list(self.rows):
+            self.remove(doc_id)
+
+    # ---------- SEARCH ----------
+
+    def search(self, query: str, k: int = 10, min_score: float = 0.2) -> list:
+        """Return up to k (score, doc_id, payload) tuples by cosine similarity, best first."""
+        if not self.rows:
+            return []
+        q = embed(query, self.dim)
+        scores = self.matrix[:self.count] @ q
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for row in top:
+            score = float(scores[row])
+            doc_id = self.row_docs.get(int(row))
+            if doc_id is None or score < min_score:
+                continue
+            results.append((score, doc_id, self.payloads[doc_id]))
+        return results
+
+
+def open_vector_index(memory_dir: str = MEMORY_DIR):
+    """
+    The semantic index if $COPILOT_SEMANTIC_MEMORY=1 (and NumPy is installed), else None.
+    Off by default: it adds a few ms per turn to build_memory_context at
+    tens of thousands of items (see benchmarks/vectors.py).
+    """
+    if os.getenv("COPILOT_SEMANTIC_MEMORY", "0") != "1":
+        return None
+    if np is None:
+        print("COPILOT_SEMANTIC_MEMORY=1 needs NumPy (pip install numpy); semantic recall is off.")
+        return None
+    return VectorIndex(memory_dir)